@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# ליבת השיבוץ – ללא תלות ב-Streamlit, לשימוש מהאפליקציה, משורת הפקודה (python -m matching) או מקוד אחר
+from .instrument import Metrics, stage, count, timed
+from .jobs import (
+    Job, JobCancelled, submit as submit_job, get_job, forget_job, current_job, progress, job_step,
+    queue_position,
+)
+from .resolve import (
+    STU_COLS, SITE_COLS, pick_col, normalize_text, extract_city,
+    resolve_students, resolve_sites,
+)
+from .files import (
+    CACHE_DIR, file_fingerprint, parse_bytes, read_table, read_path,
+    evict_sidecars, EXPORT_MIME, frame_fingerprint, write_xlsx, df_to_xlsx_bytes,
+    write_export, export_bytes,
+)
+from .gazetteer import Gazetteer, normalize_place, resolve_places
+from .geo import (
+    cities_coords, city_aliases, gazetteer, set_gazetteer_path, canonical_cities,
+    haversine, city_distance_km, haversine_matrix,
+    intern_cities, city_distance_matrix, city_band_matrix,
+)
+from .special import (
+    NEAR_WORDS, DEFAULT_KEYWORDS, load_keywords, KeywordAutomaton, RequestClassifier, default_classifier,
+)
+from .scoring import Weights, MIN_SCORE, compute_score, score_matrix, score_components, score_tables
+from .parallel import resolve_workers, parallel_score_matrix
+from .engines import (
+    MAX_PER_SUPERVISOR, UNASSIGNED, MATCH_ENGINES,
+    CandidateIndex, build_field_index, greedy_assign, optimal_assign, greedy_match, optimal_match,
+    ASSIGN_ENGINES, assign_with_pairs, assignment_to_frame, assignment_stats, run_matching,
+)
+from .pairs import partner_pairs
+from .incremental import MatchState, full_match, rematch, repair_assignment, warm_match
+from .alternatives import top_k_sites, site_alternatives
+from .summary import order_result_columns, build_summary
+from .sweep import weight_grid, gini, sweep
+from .history import (
+    HISTORY_DB, save_run, list_runs, find_run, latest_run, delete_run, load_run,
+    supervisors_with_students, student_history, site_history, supervisor_history, prior_placements,
+)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# חלופות לסטודנט: K האתרים בעלי הציון הגבוה ביותר מתוך שורת הציונים שנשמרה ב-MatchState.
+# בחירה חלקית (argpartition) ואז מיון של K האיברים בלבד, במקום למיין את כל האתרים;
+# מחושב רק לסטודנט שמבקשים, כך שאין עלות לטבלת התוצאות עצמה.
+import numpy as np
+import pandas as pd
+
+from .engines import MAX_PER_SUPERVISOR, _supervisor_codes
+from .incremental import MatchState
+
+def top_k_sites(row: np.ndarray, k: int) -> np.ndarray:
+    # מיקומי K האתרים הטובים, לפי ציון יורד (בשוויון – לפי סדר הקובץ)
+    k = min(k, len(row))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-row, k - 1)[:k]
+    return part[np.lexsort((part, -row[part]))]
+
+def site_alternatives(state: MatchState, i: int, k: int = 5) -> pd.DataFrame:
+    sites = state.sites
+    top = top_k_sites(state.scores[i], k)
+    placed = state.assign[state.assign >= 0]
+    cap_left = sites["capacity_left"].to_numpy().astype(int) - np.bincount(placed, minlength=len(sites))
+    sup, sup_u = _supervisor_codes(sites)
+    sup_left = MAX_PER_SUPERVISOR - np.bincount(sup[placed], minlength=len(sup_u))
+    rows = sites.iloc[top]
+    return pd.DataFrame({
+        "שם מקום ההתמחות": rows["site_name"].astype(str).to_numpy(),
+        "תחום ההתמחות במוסד": rows["site_field"].astype(str).to_numpy(),
+        "עיר המוסד": rows["site_city"].astype(str).to_numpy(),
+        "שם המדריך": np.asarray(sup_u, dtype=object)[sup[top]],
+        "אחוז התאמה": np.round(state.scores[i, top], 1),
+        "מקומות פנויים": cap_left[top],
+        "מכסת מדריך פנויה": sup_left[sup[top]],
+        "השיבוץ הנוכחי": top == state.assign[i],
+    })
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# מדידת ביצועים של צינור השיבוץ על נתונים סינתטיים:
+#   python -m matching.bench --sizes 100 1000 10000 --save baseline.json
+#   python -m matching.bench --sizes 100 1000 10000 --compare baseline.json
+# לכל שלב נמדדים זמן (שניות) ושיא זיכרון (tracemalloc, MB). --compare מסמן שלבים
+# שהואטו מעבר לסף, ויוצא בקוד 1 אם יש נסיגה.
+#   python -m matching.bench --sizes 100 1000 --verify
+# --verify משווה את השיבוץ האופטימלי לפתרון ייחוס של networkx (max_flow_min_cost) על אותם ציונים:
+# אותו מספר משובצים ואותו סכום ציונים. בנוסף, על נתונים עם בני/בנות זוג ומקום לכולם: כל זוג
+# משובץ יחד, וסכום הציונים של המנוע האופטימלי לפחות כשל החמדני. יוצא בקוד 1 אם יש הבדל.
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .engines import (MAX_PER_SUPERVISOR, _COST_SCALE, _optimal_units, _supervisor_codes, _supervisor_start,
+                      greedy_assign, greedy_match, optimal_assign, optimal_match)
+from .files import parse_bytes, df_to_xlsx_bytes
+from .pairs import partner_pairs
+from .resolve import resolve_students, resolve_sites
+from .scoring import Weights, compute_score, score_matrix
+from .summary import build_summary
+from .synthetic import make_dataset
+
+PAIR_SAMPLE = 2000  # compute_score נמדד על מדגם זוגות ומדווח גם כזמן לזוג
+VERIFY_MAX_PAIRS = 40_000  # networkx איטי: בקלט גדול יותר הבדיקה רצה על מדגם של סטודנטים ואתרים
+VERIFY_STUDENTS = 400
+VERIFY_CAPACITY_SHARE = 0.8  # במדגם: סך הקיבולת עד 80% מהסטודנטים, כדי שהקיבולת תגביל את השיבוץ
+VERIFY_PAIR_STUDENTS = 1000  # בדיקת בני/בנות הזוג – עד כמה סטודנטים (ומספר אתרים זהה)
+
+def _measure(fn: Callable, trace_memory: bool):
+    if trace_memory:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - t0
+    peak_mb = (tracemalloc.get_traced_memory()[1] - base) / 2**20 if trace_memory else None
+    return value, {"seconds": seconds, "peak_mb": peak_mb}
+
+def bench_size(n_students: int, n_sites: Optional[int] = None, seed: int = 0, fmt: str = "csv",
+               engines: List[str] = ("greedy", "optimal"), trace_memory: bool = True,
+               pair_rate: float = 0.0) -> Dict[str, dict]:
+    students_raw, sites_raw = make_dataset(n_students, n_sites, seed, pair_rate=pair_rate)
+    if fmt == "xlsx":
+        stu_bytes, site_bytes = df_to_xlsx_bytes(students_raw), df_to_xlsx_bytes(sites_raw)
+    else:
+        stu_bytes = students_raw.to_csv(index=False).encode("utf-8-sig")
+        site_bytes = sites_raw.to_csv(index=False).encode("utf-8-sig")
+    W = Weights()
+    stages: Dict[str, dict] = {}
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        students_raw, stages["parse_students"] = _measure(lambda: parse_bytes(stu_bytes, f"s.{fmt}"), trace_memory)
+        sites_raw, stages["parse_sites"] = _measure(lambda: parse_bytes(site_bytes, f"t.{fmt}"), trace_memory)
+        students, stages["resolve_students"] = _measure(lambda: resolve_students(students_raw), trace_memory)
+        sites, stages["resolve_sites"] = _measure(lambda: resolve_sites(sites_raw), trace_memory)
+
+        stu_rows = students.head(PAIR_SAMPLE).to_dict("records")
+        site_rows = sites.to_dict("records")
+        pairs = [(s, site_rows[k % len(site_rows)]) for k, s in enumerate(stu_rows)]
+        _, stages["compute_score"] = _measure(lambda: [compute_score(s, t, W) for s, t in pairs], trace_memory)
+        stages["compute_score"]["us_per_pair"] = stages["compute_score"]["seconds"] / max(len(pairs), 1) * 1e6
+
+        scores, stages["score_matrix"] = _measure(lambda: score_matrix(students, sites, W), trace_memory)
+        result_df = None
+        for engine in engines:
+            fn = {"greedy": greedy_match, "optimal": optimal_match}[engine]
+            result_df, stages[f"{engine}_match"] = _measure(
+                lambda: fn(students, sites.copy(), W, scores=scores), trace_memory)
+        if result_df is not None:
+            summary_df, stages["summary"] = _measure(lambda: build_summary(result_df, sites), trace_memory)
+            _, stages["xlsx_results"] = _measure(lambda: df_to_xlsx_bytes(result_df, "תוצאות"), trace_memory)
+            _, stages["xlsx_summary"] = _measure(lambda: df_to_xlsx_bytes(summary_df, "סיכום"), trace_memory)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    stages["total"] = {"seconds": sum(v["seconds"] for v in stages.values()),
+                       "peak_mb": max((v["peak_mb"] or 0) for v in stages.values()) if trace_memory else None}
+    return stages
+
+# ====== בדיקת השיבוץ האופטימלי מול networkx ======
+def reference_optimum(scores: np.ndarray, sites_df: pd.DataFrame) -> Tuple[int, int]:
+    # (משובצים, סכום ציונים ביחידות _COST_SCALE) – אותה מטרה כמו _optimal_units, בגרף המלא
+    import networkx as nx
+    q = np.rint(scores * _COST_SCALE).astype(np.int64)
+    cap = sites_df["capacity_left"].to_numpy().astype(int)
+    sup, sup_u = _supervisor_codes(sites_df)
+    quota = MAX_PER_SUPERVISOR - _supervisor_start(sup_u, None)
+    G = nx.DiGraph()
+    for i in range(q.shape[0]):
+        G.add_edge("s", ("stu", i), capacity=1, weight=0)
+        for j in np.flatnonzero(cap > 0).tolist():
+            G.add_edge(("stu", i), ("site", j), capacity=1, weight=-int(q[i, j]))
+    for j in np.flatnonzero(cap > 0).tolist():
+        G.add_edge(("site", j), ("sup", int(sup[j])), capacity=int(cap[j]), weight=0)
+    for g in range(len(sup_u)):
+        G.add_edge(("sup", g), "t", capacity=max(int(quota[g]), 0), weight=0)
+    flow = nx.max_flow_min_cost(G, "s", "t")
+    return sum(flow["s"].values()), -nx.cost_of_flow(G, flow)
+
+def verify_optimal(n_students: int, n_sites: Optional[int] = None, seed: int = 0) -> dict:
+    students_raw, sites_raw = make_dataset(n_students, n_sites, seed)
+    students, sites = resolve_students(students_raw), resolve_sites(sites_raw)
+    # מדגם שבו הביקוש גדול מהקיבולת – אחרת כל סטודנט מקבל את האתר הטוב לו והבדיקה לא בודקת כלום
+    students = students.head(VERIFY_STUDENTS)
+    cum_cap = np.cumsum(sites["capacity_left"].to_numpy().astype(int))
+    n_sites = int((cum_cap <= VERIFY_CAPACITY_SHARE * len(students)).sum())
+    sites = sites.head(max(1, min(n_sites, VERIFY_MAX_PAIRS // max(len(students), 1))))
+    scores = score_matrix(students, sites, Weights())
+    assign = _optimal_units(students, sites, scores)
+    placed = np.flatnonzero(assign >= 0)
+    total = int(np.rint(scores[placed, assign[placed]] * _COST_SCALE).sum())
+    ref_placed, ref_total = reference_optimum(scores, sites)
+    return {"students": len(students), "sites": len(sites), "capacity": int(sites["capacity_left"].sum()),
+            "placed": len(placed), "total": total,
+            "ref_placed": ref_placed, "ref_total": ref_total,
+            "ok": len(placed) == ref_placed and total == ref_total}
+
+def verify_pairs(n_students: int, seed: int = 0, pair_rate: float = 0.3) -> dict:
+    # אתר לכל סטודנט – יש מקום לכולם, ולכן כל זוג צריך לקבל אתר משותף
+    n = min(n_students, VERIFY_PAIR_STUDENTS)
+    students_raw, sites_raw = make_dataset(n, n, seed, pair_rate=pair_rate)
+    students, sites = resolve_students(students_raw), resolve_sites(sites_raw)
+    scores = score_matrix(students, sites, Weights())
+    pairs = partner_pairs(students)
+    totals, together = {}, {}
+    for engine, fn in (("greedy", greedy_assign), ("optimal", optimal_assign)):
+        assign = fn(students, sites, scores)
+        placed = np.flatnonzero(assign >= 0)
+        totals[engine] = float(scores[placed, assign[placed]].sum())
+        together[engine] = int(((assign[pairs[:, 0]] == assign[pairs[:, 1]]) & (assign[pairs[:, 0]] >= 0)).sum())
+    return {"students": n, "pairs": len(pairs), "together": together["optimal"],
+            "total": totals["optimal"], "greedy_total": totals["greedy"],
+            "ok": together["optimal"] == len(pairs) and totals["optimal"] >= totals["greedy"]}
+
+def format_report(report: Dict[str, Dict[str, dict]], baseline: Optional[dict] = None,
+                  threshold: float = 1.25) -> (str, bool):
+    lines, regressed = [], False
+    for size, stages in report.items():
+        lines.append(f"== {size} ==")
+        for stage, m in stages.items():
+            line = f"  {stage:<18} {m['seconds']:>10.4f} s"
+            if m.get("peak_mb") is not None:
+                line += f" {m['peak_mb']:>10.1f} MB"
+            if "us_per_pair" in m:
+                line += f"  ({m['us_per_pair']:.1f} µs/pair)"
+            base = (baseline or {}).get(size, {}).get(stage)
+            if base and base["seconds"] > 0:
+                ratio = m["seconds"] / base["seconds"]
+                flag = ""
+                if ratio > threshold and m["seconds"] > 0.01:
+                    flag, regressed = "  ← REGRESSION", True
+                line += f"  x{ratio:.2f} vs baseline{flag}"
+            lines.append(line)
+    return "\n".join(lines), regressed
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m matching.bench", description="מדידת ביצועים של צינור השיבוץ")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="מספרי סטודנטים (100 עד 100000)")
+    parser.add_argument("--sites", type=int, default=None, help="מספר אתרים (ברירת מחדל: סטודנטים/10, עד 1000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="פורמט הקלט שנמדד בשלב הפענוח")
+    parser.add_argument("--engines", nargs="+", choices=["greedy", "optimal"], default=["greedy", "optimal"])
+    parser.add_argument("--no-memory", action="store_true", help="ללא tracemalloc (מדידת זמן מדויקת יותר)")
+    parser.add_argument("--save", help="שמירת התוצאות כקובץ baseline (JSON)")
+    parser.add_argument("--compare", help="השוואה לקובץ baseline קודם")
+    parser.add_argument("--threshold", type=float, default=1.25, help="יחס האטה שנחשב נסיגה")
+    parser.add_argument("--pair-rate", type=float, default=0.0, help="חלק מזוגות הסטודנטים שמבקשים שיבוץ משותף")
+    parser.add_argument("--verify", action="store_true",
+                        help="השוואת השיבוץ האופטימלי לפתרון ייחוס של networkx (דורש networkx)")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for n in args.sizes:
+        report[str(n)] = bench_size(n, args.sites, args.seed, args.format, args.engines,
+                                    trace_memory=not args.no_memory, pair_rate=args.pair_rate)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    text, regressed = format_report(report, baseline, args.threshold)
+    print(text)
+
+    mismatch = False
+    if args.verify:
+        print("== verify pairs (capacity for everyone) ==")
+        for n in args.sizes:
+            v = verify_pairs(n, args.seed)
+            mismatch |= not v["ok"]
+            size = f"{v['students']}x{v['students']}"
+            print(f"  {size:<18} together {v['together']}/{v['pairs']}"
+                  f"  total {v['total']:.2f} (greedy {v['greedy_total']:.2f})  {'OK' if v['ok'] else 'MISMATCH'}")
+        try:
+            import networkx  # noqa: F401
+        except ImportError:
+            print("--verify: networkx לא מותקן, הבדיקה דולגה", file=sys.stderr)
+        else:
+            print("== verify optimal vs networkx ==")
+            for n in args.sizes:
+                v = verify_optimal(n, args.sites, args.seed)
+                mismatch |= not v["ok"]
+                size = f"{v['students']}x{v['sites']}"
+                print(f"  {size:<18} capacity {v['capacity']:<5} placed {v['placed']}/{v['ref_placed']}"
+                      f"  total {v['total'] / _COST_SCALE:.2f}/{v['ref_total'] / _COST_SCALE:.2f}"
+                      f"  {'OK' if v['ok'] else 'MISMATCH'}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "machine": platform.machine(),
+                       "args": vars(args), "results": report}, f, ensure_ascii=False, indent=2)
+    return 1 if regressed or mismatch else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# שיבוץ מקובץ לקובץ, ללא ממשק:
+#   python -m matching students.xlsx sites.xlsx -o out/ --engine optimal --format csv
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from .engines import MATCH_ENGINES, assignment_stats, run_matching
+from .files import EXPORT_MIME, file_fingerprint, read_table, write_export
+from .history import save_run
+from .scoring import Weights
+from .instrument import Metrics, stage
+from .resolve import resolve_sites
+from .summary import order_result_columns, build_summary
+
+OUTPUT_NAMES = {
+    "results": ("student_site_matching", "תוצאות"),
+    "summary": ("student_site_summary", "סיכום"),
+}
+
+def write_table(df, out_dir: Path, kind: str, fmt: str) -> Path:
+    stem, sheet_name = OUTPUT_NAMES[kind]
+    path = out_dir / f"{stem}.{fmt}"
+    write_export(df, path, fmt, sheet_name)
+    return path
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m matching",
+                                     description="שיבוץ סטודנטים למקומות הכשרה מקבצי CSV/XLSX")
+    parser.add_argument("students", help="קובץ סטודנטים (CSV/XLSX)")
+    parser.add_argument("sites", help="קובץ אתרי התמחות/מדריכים (CSV/XLSX)")
+    parser.add_argument("-o", "--out-dir", default=".", help="תיקיית פלט (ברירת מחדל: התיקייה הנוכחית)")
+    parser.add_argument("--engine", choices=sorted(MATCH_ENGINES), default="greedy", help="מנוע השיבוץ")
+    parser.add_argument("--format", choices=sorted(EXPORT_MIME), default="xlsx",
+                        help="פורמט קבצי הפלט (לתוצאות גדולות במיוחד: csv/parquet)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="מספר תהליכים לחישוב הציונים (0 = כל הליבות, ברירת מחדל: MATCH_WORKERS או 1)")
+    parser.add_argument("--save-history", action="store_true",
+                        help="שמירת הריצה בהיסטוריה (MATCH_HISTORY_DB, ברירת מחדל: match_history.sqlite)")
+    parser.add_argument("--year", type=int, default=None, help="שנת ההכשרה לשמירה בהיסטוריה (ברירת מחדל: השנה)")
+    parser.add_argument("--metrics-log", help="הוספת מדדי הביצועים של הריצה כשורות JSON לקובץ זה")
+    parser.add_argument("--profile", action="store_true", help="הפעלת cProfile והדפסת הפונקציות הכבדות ל-stderr")
+    parser.add_argument("--trace-memory", action="store_true", help="מדידת שיא זיכרון לכל שלב (tracemalloc)")
+    return parser
+
+def read_input(path) -> Tuple[str, pd.DataFrame]:
+    # טביעת האצבע של הקובץ (לשמירה בהיסטוריה) + הטבלה, בקריאה אחת של הבתים
+    path = Path(path)
+    data = path.read_bytes()
+    fingerprint = file_fingerprint(data)
+    return fingerprint, read_table(data, path.name, fingerprint)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    metrics = Metrics(label="cli", profile=args.profile, trace_memory=args.trace_memory)
+    with metrics.activate():
+        with stage("read_students"):
+            students_fp, students_raw = read_input(args.students)
+        with stage("read_sites"):
+            sites_fp, sites_raw = read_input(args.sites)
+        result_df = run_matching(students_raw, sites_raw, engine=args.engine, workers=args.workers)
+
+        out_dir = Path(args.out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        sites = resolve_sites(sites_raw)   # לקיבולת בטבלת הסיכום (הפענוח נשמר ב-cache מהשיבוץ)
+        for kind, df in (("results", order_result_columns(result_df)), ("summary", build_summary(result_df, sites))):
+            with stage(f"write_{kind}"):
+                print(write_table(df, out_dir, kind, args.format))
+        if args.save_history:
+            run_id = save_run(result_df, args.engine, Weights(), students_fp=students_fp, sites_fp=sites_fp,
+                              year=args.year)
+            print(f"history run_id={run_id}")
+
+    if args.metrics_log:
+        metrics.emit_jsonl(args.metrics_log)
+    if args.profile:
+        print(metrics.profile_text(), file=sys.stderr)
+
+    stats = assignment_stats(result_df)
+    print(f"total={stats['total']:.0f} mean={stats['mean']:.1f} unassigned={stats['unassigned']}")
+    return 0
@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+# מנועי השיבוץ: חמדני (לפי סדר הקובץ) ואופטימלי (זרימה בעלות מינימלית)
+import heapq
+from typing import Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .resolve import str_values, factorize_values, resolve_students, resolve_sites
+from .scoring import Weights, MIN_SCORE, score_matrix
+from .parallel import parallel_score_matrix
+from .instrument import timed, stage, count
+from .jobs import progress
+from .pairs import partner_pairs
+
+# ====== שיבוץ ======
+MAX_PER_SUPERVISOR = 2   # עד 2 סטודנטים לכל מדריך
+UNASSIGNED = "לא שובץ"
+
+def _unassigned_row(s, min_score: float = MIN_SCORE) -> dict:
+    return {
+        "ת\"ז הסטודנט": s["stu_id"],
+        "שם פרטי": s["stu_first"],
+        "שם משפחה": s["stu_last"],
+        "שם מקום ההתמחות": UNASSIGNED,
+        "עיר המוסד": "",
+        "תחום ההתמחות במוסד": "",
+        "שם המדריך": "",
+        "אחוז התאמה": min_score  # גם כשאין, נשמור את הציון המינימלי של המשקולות
+    }
+
+def _assigned_row(s, site, score: float) -> dict:
+    return {
+        "ת\"ז הסטודנט": s["stu_id"],
+        "שם פרטי": s["stu_first"],
+        "שם משפחה": s["stu_last"],
+        "שם מקום ההתמחות": site["site_name"],
+        "עיר המוסד": site.get("site_city", ""),
+        "תחום ההתמחות במוסד": site["site_field"],
+        "שם המדריך": site.get("שם המדריך", ""),
+        "אחוז התאמה": round(float(score), 1)
+    }
+
+def _supervisor_codes(sites_df: pd.DataFrame):
+    # קוד שלם לכל מדריך (לפי "שם המדריך"), כמו המפתח של מגבלת המדריכים
+    sup_names = (sites_df["שם המדריך"] if "שם המדריך" in sites_df.columns
+                 else pd.Series([""] * len(sites_df), index=sites_df.index))
+    return pd.factorize(sup_names.astype(object), sort=False)
+
+def _supervisor_start(sup_u, supervisor_load: Optional[dict]) -> np.ndarray:
+    # כמה סטודנטים כבר משובצים לכל מדריך (בשיבוץ מצטבר – סטודנטים שנשארו במקומם)
+    load = supervisor_load or {}
+    return np.array([load.get(name, 0) for name in sup_u], dtype=int)
+
+def assignment_to_frame(students_df: pd.DataFrame, sites_df: pd.DataFrame,
+                        scores: np.ndarray, assign: np.ndarray, min_score: float = MIN_SCORE) -> pd.DataFrame:
+    # assign[i] = מיקום האתר של סטודנט i, או -1 אם לא שובץ
+    site_rows = sites_df.to_dict("records")
+    results = []
+    for i, s in enumerate(students_df.to_dict("records")):
+        j = int(assign[i])
+        results.append(_unassigned_row(s, min_score) if j < 0 else _assigned_row(s, site_rows[j], scores[i, j]))
+    return pd.DataFrame(results)
+
+# ====== אינדקס מועמדים לשיבוץ החמדני ======
+# במקום לסנן ולמיין את כל טבלת האתרים לכל סטודנט:
+# - field_index: תחום מועדף → אתרים שתחומם מכיל אותו (מחושב פעם אחת),
+# - open: מסכה חיה של אתרים פתוחים, מתעדכנת כשנגמרת קיבולת או מכסת מדריך,
+# - nonfield_max: הציון הגבוה ביותר שסטודנט יכול לקבל באתר שאינו בתחום שלו.
+# אם האתר הטוב בתחום עולה על nonfield_max, אין צורך לבדוק אתרים אחרים;
+# אחרת – argmax על כל האתרים הפתוחים. בשוויון נבחר האתר הראשון בקובץ.
+def build_field_index(students_df: pd.DataFrame, sites_df: pd.DataFrame) -> dict:
+    site_field = str_values(sites_df, "site_field")
+    prefs = dict.fromkeys(str_values(students_df, "stu_pref"))
+    return {p: np.array([j for j, f in enumerate(site_field) if p and f and p in f], dtype=np.int64)
+            for p in prefs}
+
+_INDEX_CHUNK = 4_000_000   # תאים לכל מקטע בבניית האינדקס (32MB של float64)
+
+class CandidateIndex:
+    def __init__(self, students_df: pd.DataFrame, sites_df: pd.DataFrame, scores: np.ndarray,
+                 supervisor_load: Optional[dict] = None):
+        self.scores = scores
+        self.prefs = str_values(students_df, "stu_pref")
+        self.field_index = build_field_index(students_df, sites_df)
+        self.cap_left = sites_df["capacity_left"].to_numpy().astype(int)
+        self.sup, sup_u = _supervisor_codes(sites_df)
+        self.sup_count = _supervisor_start(sup_u, supervisor_load)
+        self.sup_sites = [np.flatnonzero(self.sup == g) for g in range(len(sup_u))]
+        self.open = (self.cap_left > 0) & (self.sup_count[self.sup] < MAX_PER_SUPERVISOR)
+        self.n_open = int(self.open.sum())
+        self.pruned_picks = 0
+        self.full_scans = 0
+
+        # הציון הגבוה ביותר מחוץ לתחום – לכל קבוצת העדפה, במקטעי שורות (בלי מטריצות עזר בגודל המלא)
+        self.nonfield_max = np.full(scores.shape[0], -np.inf)
+        step = max(1, _INDEX_CHUNK // max(scores.shape[1], 1))
+        pref_codes, pref_u = factorize_values(self.prefs)
+        for k, p in enumerate(pref_u):
+            rows = np.flatnonzero(pref_codes == k)
+            cols = self.field_index[p]
+            for start in range(0, len(rows), step):
+                r = rows[start:start + step]
+                block = scores[r]
+                block[:, cols] = -np.inf
+                self.nonfield_max[r] = block.max(axis=1, initial=-np.inf)
+
+    def best_site(self, i: int) -> int:
+        if self.n_open == 0:
+            return -1
+        row = self.scores[i]
+        cand = self.field_index[self.prefs[i]]
+        cand = cand[self.open[cand]]
+        if len(cand):
+            j = int(cand[np.argmax(row[cand])])
+            if row[j] > self.nonfield_max[i]:
+                self.pruned_picks += 1
+                return j
+        self.full_scans += 1
+        return int(np.argmax(np.where(self.open, row, -np.inf)))
+
+    def best_pair_site(self, a: int, b: int) -> int:
+        # אתר פתוח עם שני מקומות פנויים ושתי משבצות אצל המדריך, בסכום הציונים הגבוה ביותר
+        ok = self.open & (self.cap_left >= 2) & (self.sup_count[self.sup] <= MAX_PER_SUPERVISOR - 2)
+        if not ok.any():
+            return -1
+        return int(np.argmax(np.where(ok, self.scores[a] + self.scores[b], -np.inf)))
+
+    def take(self, j: int) -> None:
+        self.cap_left[j] -= 1
+        if self.cap_left[j] == 0 and self.open[j]:
+            self.open[j] = False
+            self.n_open -= 1
+        g = self.sup[j]
+        self.sup_count[g] += 1
+        if self.sup_count[g] >= MAX_PER_SUPERVISOR:
+            closing = self.sup_sites[g][self.open[self.sup_sites[g]]]
+            self.open[closing] = False
+            self.n_open -= len(closing)
+
+def _greedy_units(students_df: pd.DataFrame, sites_df: pd.DataFrame, scores: np.ndarray,
+                  supervisor_load: Optional[dict] = None, pairs: Optional[np.ndarray] = None) -> np.ndarray:
+    # pairs – זוגות (מיקומי שורות); זוג משובץ כיחידה אחת במקום של החבר הראשון שלו בקובץ
+    with stage("candidate_index"):
+        index = CandidateIndex(students_df, sites_df, scores, supervisor_load)
+    assign = np.full(len(students_df), -1, dtype=np.int64)
+    partner = np.full(len(students_df), -1, dtype=np.int64)
+    if pairs is not None and len(pairs):
+        partner[pairs[:, 0]], partner[pairs[:, 1]] = pairs[:, 1], pairs[:, 0]
+    done = np.zeros(len(students_df), dtype=bool)
+    pairs_placed = pairs_split = 0
+
+    with stage("greedy_loop"):
+        n = len(students_df)
+        for i in range(n):
+            if i % 1024 == 0:
+                progress(i, n)
+            if done[i]:
+                continue
+            k = int(partner[i])
+            if k >= 0:
+                # זוג: שני מקומות באותו אתר; אם אין – כל אחד לחוד, כאן ועכשיו (לפי סדר הקובץ)
+                done[k] = True
+                j = index.best_pair_site(i, k)
+                if j >= 0:
+                    index.take(j)
+                    index.take(j)
+                    assign[i] = assign[k] = j
+                    pairs_placed += 1
+                    continue
+                pairs_split += 1
+            # האתר הפתוח בעל הציון הגבוה ביותר (כולל מגבלת עד 2 סטודנטים לכל מדריך)
+            for u in ((i, k) if k >= 0 else (i,)):
+                j = index.best_site(u)
+                if j >= 0:
+                    index.take(j)
+                    assign[u] = j
+        count("pruned_picks", index.pruned_picks)
+        count("full_scans", index.full_scans)
+        if pairs is not None and len(pairs):
+            count("pairs_placed", pairs_placed)
+            count("pairs_split", pairs_split)
+    return assign
+
+@timed("greedy_assign")
+def greedy_assign(students_df: pd.DataFrame, sites_df: pd.DataFrame, scores: np.ndarray,
+                  supervisor_load: Optional[dict] = None) -> np.ndarray:
+    return _greedy_units(students_df, sites_df, scores, supervisor_load, pairs=partner_pairs(students_df))
+
+@timed("greedy_match")
+def greedy_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                 scores: Optional[np.ndarray] = None) -> pd.DataFrame:
+    if scores is None:
+        scores = score_matrix(students_df, sites_df, W)
+    assign = greedy_assign(students_df, sites_df, scores)
+    sites_df["capacity_left"] = sites_df["capacity_left"].to_numpy() - np.bincount(
+        assign[assign >= 0], minlength=len(sites_df))
+    return assignment_to_frame(students_df, sites_df, scores, assign, W.min_score)
+
+# ====== שיבוץ אופטימלי (זרימה בעלות מינימלית) ======
+# רשת: מקור → מחלקת סטודנטים → סוג אתר → מדריך → בור.
+# מחלקת סטודנטים = סטודנטים עם שורת ציונים זהה, סוג אתר = אתרים עם עמודת ציונים זהה,
+# כך שהגרף קטן בהרבה מ-סטודנטים×אתרים. זוגות בציון המינימלי עוברים דרך צומת "מאגר" אחד
+# במקום קשת לכל זוג. כל אתר הוא קשת סוג→מדריך בקיבולת capacity_left, והמדריך → בור
+# בקיבולת MAX_PER_SUPERVISOR. הפתרון: מקסימום סטודנטים משובצים, ומביניהם סכום ציונים מקסימלי.
+_COST_SCALE = 100  # ציונים → עלויות שלמות (השוואת "עלות מופחתת == 0" מדויקת)
+PAIR_CANDIDATES = 8  # בשלב הזוגות: כל זוג נבחן מול 8 האתרים הטובים לו (ועוד האתר הפנוי הטוב ביותר)
+
+class _MinCostFlow:
+    def __init__(self, n: int):
+        self.n = n
+        self.graph: List[List[int]] = [[] for _ in range(n)]
+        self.to: List[int] = []
+        self.cap: List[int] = []
+        self.cost: List[int] = []
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        e = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.graph[u].append(e)
+        self.graph[v].append(e + 1)
+        return e
+
+    def flow(self, e: int) -> int:
+        return self.cap[e ^ 1]
+
+    def run(self, s: int, t: int, pot: List[int], demand: int = 0) -> int:
+        # primal-dual: דייקסטרה עם פוטנציאלים, ואז זרימה חוסמת (Dinic) על הקשתות
+        # שעלותן המופחתת 0. מספר השלבים חסום במספר ערכי העלות השונים של מסלול משפר.
+        # demand – חסם עליון לזרימה, לדיווח התקדמות בלבד
+        n, to, cap, cost, graph = self.n, self.to, self.cap, self.cost, self.graph
+        INF = float("inf")
+        phases = pushed = 0
+        while True:
+            dist = [INF] * n
+            dist[s] = 0
+            heap = [(0, s)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                pu = pot[u]
+                for e in graph[u]:
+                    if cap[e] > 0:
+                        v = to[e]
+                        nd = d + cost[e] + pu - pot[v]
+                        if nd < dist[v]:
+                            dist[v] = nd
+                            heapq.heappush(heap, (nd, v))
+            if dist[t] == INF:
+                return phases
+            phases += 1
+            for v in range(n):
+                if dist[v] < INF:
+                    pot[v] += dist[v]
+
+            while True:
+                level = [-1] * n
+                level[s] = 0
+                queue = [s]
+                for u in queue:
+                    for e in graph[u]:
+                        v = to[e]
+                        if cap[e] > 0 and level[v] < 0 and cost[e] + pot[u] - pot[v] == 0:
+                            level[v] = level[u] + 1
+                            queue.append(v)
+                if level[t] < 0:
+                    break
+                it = [0] * n
+                while True:
+                    u, path = s, []
+                    while u != t:
+                        adj = graph[u]
+                        while it[u] < len(adj):
+                            e = adj[it[u]]
+                            v = to[e]
+                            if cap[e] > 0 and level[v] == level[u] + 1 and cost[e] + pot[u] - pot[v] == 0:
+                                break
+                            it[u] += 1
+                        if it[u] < len(adj):
+                            path.append(adj[it[u]])
+                            u = to[adj[it[u]]]
+                        elif u == s:
+                            break
+                        else:
+                            level[u] = -1
+                            u = to[path.pop() ^ 1]
+                            it[u] += 1
+                    if u != t:
+                        break
+                    f = min(cap[e] for e in path)
+                    for e in path:
+                        cap[e] -= f
+                        cap[e ^ 1] += f
+                    pushed += f
+            progress(pushed, demand)
+
+def _top_demand_mask(Q: np.ndarray, counts: np.ndarray, demand: int) -> np.ndarray:
+    # לכל סוג אתר: רק המחלקות שמכסות את demand הסטודנטים הטובים ביותר לסוג (בשוויון – לפי סדר).
+    # אפשר לוותר על שאר הקשתות: אם סטודנט מחוץ ל-demand הטובים משובץ לסוג, אחד מה-demand
+    # הטובים לא שובץ כלל (יש לכל היותר demand משובצים), והחלפה ביניהם לא מורידה את הציון
+    # ולא את מספר המשובצים.
+    order = np.argsort(-Q, axis=0, kind="stable")
+    cum = np.cumsum(counts[order], axis=0)
+    k = (cum < demand).sum(axis=0)
+    keep = np.zeros(Q.shape, dtype=bool)
+    np.put_along_axis(keep, order, np.arange(len(Q))[:, None] <= k[None, :], axis=0)
+    return keep
+
+def _group_identical(rows: np.ndarray):
+    # קיבוץ שורות זהות: קוד לכל שורה + אינדקס שורה מייצגת לכל קבוצה
+    codes, _ = pd.factorize(pd.Series([r.tobytes() for r in rows], dtype=object))
+    _, rep = np.unique(codes, return_index=True)
+    return codes, rep
+
+def _optimal_units(students_df: pd.DataFrame, sites_df: pd.DataFrame, scores: np.ndarray,
+                   supervisor_load: Optional[dict] = None) -> np.ndarray:
+    n_stu, n_site = scores.shape
+    assign = np.full(n_stu, -1, dtype=np.int64)
+    if n_stu == 0 or n_site == 0:
+        return assign
+
+    with stage("flow_build"):
+        cap_left = sites_df["capacity_left"].to_numpy().astype(int)
+        sup, sup_u = _supervisor_codes(sites_df)
+        n_sup = len(sup_u)
+        sup_quota = MAX_PER_SUPERVISOR - _supervisor_start(sup_u, supervisor_load)
+        # רק אתרים שיש בהם מקום ושלמדריך שלהם נשארה מכסה נכנסים לרשת
+        usable = np.flatnonzero((cap_left > 0) & (sup_quota[sup] > 0))
+        if len(usable) == 0:
+            return assign
+        demand = min(n_stu, int(cap_left[usable].sum()), int(np.maximum(sup_quota, 0).sum()))
+
+        q = np.rint(scores[:, usable] * _COST_SCALE).astype(np.int64)
+        floor = int(q.min())
+        cls, cls_rep = _group_identical(q)
+        typ, typ_rep = _group_identical(np.ascontiguousarray(q.T))
+        Q = q[cls_rep][:, typ_rep]
+        n_cls, n_typ = Q.shape
+        cls_count = np.bincount(cls, minlength=n_cls)
+
+        # צמתים: 0=מקור, מחלקות, מאגר, סוגים, מדריכים, בור
+        S, C0 = 0, 1
+        POOL = C0 + n_cls
+        T0 = POOL + 1
+        G0 = T0 + n_typ
+        SINK = G0 + n_sup
+        big = int(n_stu)
+        net = _MinCostFlow(SINK + 1)
+
+        pot = [0] * (SINK + 1)
+        for c in range(n_cls):
+            net.add_edge(S, C0 + c, int(cls_count[c]), 0)
+            net.add_edge(C0 + c, POOL, big, -floor)
+        pot[POOL] = -floor
+        typ_pot = np.full(n_typ, -floor, dtype=np.int64)
+        keep = (Q > floor) & _top_demand_mask(Q, cls_count, demand)
+        cc, tt = np.nonzero(keep)
+        for c, t in zip(cc.tolist(), tt.tolist()):
+            net.add_edge(C0 + c, T0 + t, big, -int(Q[c, t]))
+        if len(cc):
+            np.minimum.at(typ_pot, tt, -Q[cc, tt])
+        for t in range(n_typ):
+            net.add_edge(POOL, T0 + t, big, 0)
+            pot[T0 + t] = int(typ_pot[t])
+
+        site_edges = {}
+        for k, j in enumerate(usable.tolist()):
+            site_edges[j] = (net.add_edge(T0 + typ[k], G0 + sup[j], int(cap_left[j]), 0), int(typ[k]))
+            pot[G0 + sup[j]] = min(pot[G0 + sup[j]], pot[T0 + typ[k]])
+        for g in range(n_sup):
+            net.add_edge(G0 + g, SINK, max(int(sup_quota[g]), 0), 0)
+            pot[SINK] = min(pot[SINK], pot[G0 + g])
+
+        count("flow_nodes", net.n)
+        count("flow_edges", len(net.to) // 2)
+
+    with stage("flow_solve"):
+        count("flow_phases", net.run(S, SINK, pot, demand))
+
+    with stage("flow_decode"):
+        # פירוק הזרימה חזרה לזוגות סטודנט–אתר
+        slots = {t: [] for t in range(n_typ)}
+        for j, (e, t) in site_edges.items():
+            slots[t] += [j] * net.flow(e)
+        per_class = {c: [] for c in range(n_cls)}
+        pooled = []
+        for c in range(n_cls):
+            for e in net.graph[C0 + c]:
+                if e % 2 == 0 and net.flow(e) > 0:
+                    v = net.to[e]
+                    if v == POOL:
+                        pooled += [c] * net.flow(e)
+                    else:
+                        for _ in range(net.flow(e)):
+                            per_class[c].append(slots[v - T0].pop())
+        for t in range(n_typ):
+            while slots[t]:
+                per_class[pooled.pop()].append(slots[t].pop())
+
+        for c in range(n_cls):
+            members = np.flatnonzero(cls == c)
+            for i, j in zip(members.tolist(), sorted(per_class[c])):
+                assign[i] = j
+    return assign
+
+@timed("optimal_assign")
+def optimal_assign(students_df: pd.DataFrame, sites_df: pd.DataFrame, scores: np.ndarray,
+                   supervisor_load: Optional[dict] = None) -> np.ndarray:
+    return assign_with_pairs(_optimal_units, students_df, sites_df, scores, supervisor_load)
+
+@timed("optimal_match")
+def optimal_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                  scores: Optional[np.ndarray] = None) -> pd.DataFrame:
+    if scores is None:
+        scores = score_matrix(students_df, sites_df, W)
+    assign = optimal_assign(students_df, sites_df, scores)
+    sites_df["capacity_left"] = sites_df["capacity_left"].to_numpy() - np.bincount(
+        assign[assign >= 0], minlength=len(sites_df))
+    return assignment_to_frame(students_df, sites_df, scores, assign, W.min_score)
+
+# ====== בני/בנות זוג להכשרה (מנוע אופטימלי) ======
+# כל זוג הוא יחידה אחת שצריכה שני מקומות באותו אתר ושתי משבצות אצל אותו מדריך, ומשקלה סכום
+# שני הציונים. זוג לא קודם לאחרים: הוא מתחרה על המקומות מול הסטודנטים הבודדים.
+# 1) שיבוץ בסיס של כל הסטודנטים כבודדים (אותו מנוע, פתרון אחד) – גם בני הזוג מתחרים כל אחד לחוד.
+# 2) כל זוג (מהחזק לחלש) יוצא ממקומותיו ונבחן מול PAIR_CANDIDATES האתרים הטובים לו ומול האתר
+#    הפנוי הטוב ביותר. כדי לפנות באתר שני מקומות ושתי משבצות אצל המדריך מזיזים את הבודדים בעלי
+#    הציון הנמוך ביותר, וכל מוזז עובר למקום הפנוי הטוב ביותר בשבילו (גם המקומות שהזוג פינה).
+#    הזוג נכנס רק אם מספר המשובצים לא קטן, ורק אם סכום הציונים שלו לפחות כהפסד של המוזזים;
+#    אחרת בני הזוג חוזרים למקומות שקיבלו בשיבוץ הבסיס.
+# 3) אם נשארו מקומות פנויים, מי שלא שובץ משובץ מולם. שאר השיבוץ לא נפתר מחדש.
+def _colocate_pairs(pairs: np.ndarray, base: np.ndarray, sites_df: pd.DataFrame, scores: np.ndarray,
+                    supervisor_load: Optional[dict]) -> np.ndarray:
+    # משנה את base במקום (זוגות שעברו לאתר משותף + מוזזים); מחזיר את אתר כל זוג, או -1
+    cap = np.maximum(sites_df["capacity_left"].to_numpy().astype(int), 0)
+    sup, sup_u = _supervisor_codes(sites_df)
+    quota = np.maximum(MAX_PER_SUPERVISOR - _supervisor_start(sup_u, supervisor_load), 0)
+    site_occ = [set() for _ in range(len(cap))]
+    sup_occ = [set() for _ in range(len(quota))]
+    occ = np.zeros(len(cap), dtype=int)
+    load = np.zeros(len(quota), dtype=int)
+    cur = np.zeros(len(base))
+
+    def move(i: int, j: int) -> None:
+        old = int(base[i])
+        if old >= 0:
+            site_occ[old].discard(i)
+            sup_occ[sup[old]].discard(i)
+            occ[old] -= 1
+            load[sup[old]] -= 1
+        base[i] = j
+        cur[i] = scores[i, j] if j >= 0 else 0.0
+        if j >= 0:
+            site_occ[j].add(i)
+            sup_occ[sup[j]].add(i)
+            occ[j] += 1
+            load[sup[j]] += 1
+
+    for i in np.flatnonzero(base >= 0).tolist():
+        j = int(base[i])
+        base[i] = -1
+        move(i, j)
+    fixed = np.zeros(len(base), dtype=bool)
+    fits = (cap >= 2) & (quota[sup] >= 2)
+    result = np.full(len(pairs), -1, dtype=np.int64)
+
+    def displaced(j: int) -> Optional[List[int]]:
+        # הבודדים (בעלי הציון הנמוך ביותר) שצריך להזיז כדי לפנות 2 מקומות באתר ו-2 משבצות אצל המדריך
+        movable = sorted((i for i in site_occ[j] if not fixed[i]), key=cur.__getitem__)
+        need = max(int(occ[j]) + 2 - cap[j], 0)
+        if need > len(movable):
+            return None
+        out = movable[:need]
+        g = sup[j]
+        rest = sorted((i for i in sup_occ[g] if not fixed[i] and i not in out), key=cur.__getitem__)
+        need = max(int(load[g]) - len(out) + 2 - quota[g], 0)
+        if need > len(rest):
+            return None
+        return out + rest[:need]
+
+    def rehome(j: int, out: List[int]) -> List[Tuple[int, int]]:
+        # לאן עובר כל מוזז אחרי שהזוג נכנס ל-j: המקום הפנוי הטוב ביותר בשבילו, או -1
+        occ2, load2 = occ.copy(), load.copy()
+        for i in out:
+            occ2[base[i]] -= 1
+            load2[sup[base[i]]] -= 1
+        occ2[j] += 2
+        load2[sup[j]] += 2
+        moves = []
+        for i in sorted(out, key=lambda i: -cur[i]):
+            ok = (occ2 < cap) & (load2[sup] < quota[sup])
+            k = int(np.argmax(np.where(ok, scores[i], -np.inf))) if ok.any() else -1
+            if k >= 0:
+                occ2[k] += 1
+                load2[sup[k]] += 1
+            moves.append((i, k))
+        return moves
+
+    pair_scores = scores[pairs[:, 0]] + scores[pairs[:, 1]]
+    k_top = min(PAIR_CANDIDATES, scores.shape[1])
+    for p in np.argsort(-pair_scores.max(axis=1, initial=0), kind="stable").tolist():
+        a, b = (int(x) for x in pairs[p])
+        s = pair_scores[p]
+        home = (int(base[a]), int(base[b]))
+        if home[0] >= 0 and home[0] == home[1]:
+            fixed[a] = fixed[b] = True   # כבר יחד בשיבוץ הבסיס
+            result[p] = home[0]
+            continue
+        before = sum(j >= 0 for j in home)
+        move(a, -1)
+        move(b, -1)
+        free = fits & (cap - occ >= 2) & (quota[sup] - load[sup] >= 2)
+        cands = set(np.argpartition(-np.where(fits, s, -np.inf), k_top - 1)[:k_top].tolist())
+        if free.any():
+            cands.add(int(np.argmax(np.where(free, s, -np.inf))))
+        best, best_key, best_moves = -1, None, None
+        for j in sorted(cands):
+            out = displaced(j) if fits[j] else None
+            if out is None:
+                continue
+            moves = rehome(j, out) if out else []
+            lost = sum(k < 0 for _, k in moves)
+            gain = float(s[j] + sum(scores[i, k] - cur[i] if k >= 0 else -cur[i] for i, k in moves))
+            key = (-lost, gain)
+            if best_key is None or key > best_key:
+                best, best_key, best_moves = j, key, moves
+        if best >= 0 and 2 + best_key[0] >= before and best_key[1] >= 0:
+            for i, _ in best_moves:
+                move(i, -1)
+            move(a, best)
+            move(b, best)
+            for i, k in best_moves:
+                if k >= 0:
+                    move(i, k)
+            fixed[a] = fixed[b] = True
+            result[p] = best
+        else:
+            move(a, home[0])
+            move(b, home[1])
+    return result
+
+def assign_with_pairs(unit_fn, students_df: pd.DataFrame, sites_df: pd.DataFrame, scores: np.ndarray,
+                      supervisor_load: Optional[dict] = None) -> np.ndarray:
+    pairs = partner_pairs(students_df)
+    if not len(pairs):
+        return unit_fn(students_df, sites_df, scores, supervisor_load)
+
+    assign = unit_fn(students_df, sites_df, scores, supervisor_load)
+    with stage("pairs"):
+        together = _colocate_pairs(pairs, assign, sites_df, scores, supervisor_load)
+        placed = together >= 0
+        count("pairs_placed", int(placed.sum()))
+        count("pairs_split", int((~placed).sum()))
+
+    # מי שלא שובץ – מול הקיבולת ומכסות המדריכים שנותרו (מקומות שזוגות פינו)
+    free = np.flatnonzero(assign < 0)
+    cap_left = sites_df["capacity_left"].to_numpy().astype(int)
+    used = np.bincount(assign[assign >= 0], minlength=len(sites_df))
+    if len(free) and (cap_left - used > 0).any():
+        sup, sup_u = _supervisor_codes(sites_df)
+        start = _supervisor_start(sup_u, supervisor_load)
+        residual = sites_df.assign(capacity_left=cap_left - used)
+        load = start + np.bincount(sup[assign[assign >= 0]], minlength=len(sup_u))
+        assign[free] = unit_fn(students_df.iloc[free], residual, scores[free], dict(zip(sup_u, load.tolist())))
+    return assign
+
+MATCH_ENGINES = {
+    "greedy": greedy_match,
+    "optimal": optimal_match,
+}
+
+ASSIGN_ENGINES = {
+    "greedy": greedy_assign,
+    "optimal": optimal_assign,
+}
+
+def assignment_stats(result_df: pd.DataFrame) -> dict:
+    placed = result_df[result_df["שם מקום ההתמחות"] != UNASSIGNED]
+    return {
+        "total": float(placed["אחוז התאמה"].sum()),
+        "mean": float(placed["אחוז התאמה"].mean()) if len(placed) else 0.0,
+        "unassigned": int(len(result_df) - len(placed)),
+    }
+
+def run_matching(students_raw: pd.DataFrame, sites_raw: pd.DataFrame, engine: str = "greedy",
+                 W: Optional[Weights] = None, workers: Optional[int] = None) -> pd.DataFrame:
+    # נקודת כניסה לספרייה: קבצים גולמיים → טבלת שיבוץ
+    W = W or Weights()
+    students = resolve_students(students_raw)
+    sites    = resolve_sites(sites_raw)
+    scores   = parallel_score_matrix(students, sites, W, workers=workers)
+    return MATCH_ENGINES[engine](students, sites, W, scores=scores)
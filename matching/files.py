@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# קריאת קבצי קלט (עם קבצי Parquet צדדיים) וכתיבת XLSX
+import os
+import hashlib
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .instrument import timed, count
+
+# ----- קריאת קבצים -----
+# כל קובץ מזוהה לפי טביעת אצבע (SHA-256) של התוכן. האפליקציה שומרת את הטבלה המפוענחת ב-cache בזיכרון.
+# אפשר גם לשמור אותה בקובץ Parquet צדדי בתיקיית CACHE_DIR (מוגבל בנפח, הישנים נמחקים ראשונים), כך
+# שקריאה חוזרת של אותו קובץ, גם אחרי הפעלה מחדש, מדלגת על פענוח ה-Excel. הקבצים הצדדיים מכילים את
+# פרטי הסטודנטים כמו שהם, ולכן כבויים כברירת מחדל: MATCH_SIDECAR=1 מפעיל אותם.
+CACHE_DIR = Path(os.environ.get("MATCH_CACHE_DIR", ".match_cache"))
+SIDECAR_ENABLED = os.environ.get("MATCH_SIDECAR", "0").strip().lower() in ("1", "true", "yes", "on")
+SIDECAR_MAX_BYTES = 512 * 1024 * 1024
+
+def file_fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+@timed("parse")
+def parse_bytes(data: bytes, name: str) -> pd.DataFrame:
+    name = (name or "").lower()
+    buf = BytesIO(data)
+    if name.endswith(".csv"):
+        return pd.read_csv(buf, encoding="utf-8-sig")
+    if name.endswith((".xlsx",".xls")):
+        return pd.read_excel(buf)
+    return pd.read_csv(buf, encoding="utf-8-sig")
+
+def _sidecar_path(fingerprint: str) -> Path:
+    return CACHE_DIR / f"{fingerprint}.parquet"
+
+def _read_sidecar(fingerprint: str) -> Optional[pd.DataFrame]:
+    path = _sidecar_path(fingerprint)
+    if not path.exists():
+        return None
+    try:
+        df = pd.read_parquet(path)
+        count("sidecar_hits")
+        path.touch()  # מסמן שימוש אחרון לצורך פינוי
+        return df
+    except Exception:
+        return None  # אין pyarrow / קובץ פגום – נפענח מהמקור
+
+def _write_sidecar(fingerprint: str, df: pd.DataFrame) -> None:
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(_sidecar_path(fingerprint), index=False)
+        evict_sidecars()
+    except Exception:
+        return  # עמודות בסוג מעורב / אין pyarrow / אין הרשאת כתיבה – מוותרים על הקובץ הצדדי
+
+def evict_sidecars(max_bytes: int = SIDECAR_MAX_BYTES) -> None:
+    files = []
+    for f in CACHE_DIR.glob("*.parquet"):
+        try:
+            st = f.stat()
+        except OSError:
+            continue  # נמחק בינתיים בתהליך אחר
+        files.append((st.st_mtime, st.st_size, f))
+    total = 0
+    for _, size, f in sorted(files, key=lambda t: t[0], reverse=True):
+        total += size
+        if total > max_bytes:
+            f.unlink(missing_ok=True)
+
+def read_table(data: bytes, name: str, fingerprint: Optional[str] = None,
+               sidecar: Optional[bool] = None) -> pd.DataFrame:
+    # sidecar=None → לפי MATCH_SIDECAR
+    if not (SIDECAR_ENABLED if sidecar is None else sidecar):
+        return parse_bytes(data, name)
+    fingerprint = fingerprint or file_fingerprint(data)
+    df = _read_sidecar(fingerprint)
+    if df is None:
+        df = parse_bytes(data, name)
+        _write_sidecar(fingerprint, df)
+    return df
+
+def read_path(path) -> pd.DataFrame:
+    path = Path(path)
+    return read_table(path.read_bytes(), path.name)
+
+# ---- ייצוא ----
+# הייצוא נכתב שורה-שורה במצב constant_memory של xlsxwriter, במקטעים של EXPORT_CHUNK שורות,
+# כך שגם טבלת תוצאות גדולה לא נבנית כולה בזיכרון. לקבצים גדולים במיוחד – CSV או Parquet.
+EXPORT_CHUNK = 10_000
+EXPORT_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    # טביעת אצבע לתוכן הטבלה (ערכים + שמות עמודות), מפתח ל-cache של קבצי הייצוא
+    h = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    h.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    return h.hexdigest()
+
+def write_xlsx(df: pd.DataFrame, target, sheet_name: str = "שיבוץ") -> None:
+    import xlsxwriter
+    cols = list(df.columns)
+    has_match_col = "אחוז התאמה" in cols
+    if has_match_col:
+        cols = [c for c in cols if c != "אחוז התאמה"] + ["אחוז התאמה"]
+
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        if has_match_col:
+            red_fmt = workbook.add_format({"font_color": "red"})
+            col_idx = len(cols) - 1
+            worksheet.set_column(col_idx, col_idx, 12, red_fmt)
+        worksheet.write_row(0, 0, [str(c) for c in cols])
+        r = 1
+        for start in range(0, len(df), EXPORT_CHUNK):
+            chunk = df[cols].iloc[start:start + EXPORT_CHUNK].astype(object)
+            for values in chunk.where(chunk.notna(), None).to_numpy().tolist():
+                worksheet.write_row(r, 0, values)
+                r += 1
+    finally:
+        workbook.close()
+
+@timed("xlsx")
+def df_to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "שיבוץ") -> bytes:
+    xlsx_io = BytesIO()
+    write_xlsx(df, xlsx_io, sheet_name)
+    return xlsx_io.getvalue()
+
+@timed("export")
+def write_export(df: pd.DataFrame, target, fmt: str = "xlsx", sheet_name: str = "שיבוץ") -> None:
+    # target: נתיב או אובייקט קובץ בינארי
+    if fmt == "xlsx":
+        write_xlsx(df, target, sheet_name)
+    elif fmt == "csv":
+        df.to_csv(target, index=False, encoding="utf-8-sig")
+    elif fmt == "parquet":
+        df.to_parquet(target, index=False)
+    else:
+        raise ValueError(f"פורמט ייצוא לא נתמך: {fmt}")
+
+def export_bytes(df: pd.DataFrame, fmt: str = "xlsx", sheet_name: str = "שיבוץ") -> bytes:
+    buf = BytesIO()
+    write_export(df, buf, fmt, sheet_name)
+    return buf.getvalue()
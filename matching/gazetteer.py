@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# מאגר יישובים: שם קנוני + קואורדינטות + כינויים (כתיב מלא/חסר, ראשי תיבות, שמות קודמים).
+# - אינדקס במילון לפי מפתח מנורמל (בלי גרשיים/מקפים/רווחים כפולים), ואינדקס שני לפי "שלד"
+#   בלי ו/י, כך ש"פתח תקוה" ו"פתח תקווה" הם אותו יישוב; רק אם אין התאמה – חיפוש מקורב במרחק עריכה
+#   (עד אות אחת בשמות קצרים, עד שתיים בארוכים; אם שני יישובים שונים קרובים באותה מידה – אין התאמה).
+# - קובצי מאגר נוספים מרחיבים את הרשימה המובנית: CSV בעמודות name,lat,lon,aliases (כינויים מופרדים
+#   ב-|), או קובץ היישובים של הלמ"ס כמו שהוא (CSV/Excel, "שם יישוב" + "קואורדינטות" ברשת ישראל
+#   החדשה – ITM, שמומרות כאן ל-WGS84).
+# - כל פענוח (עיר או כתובת → שם קנוני) נשמר ב-SQLite בתיקיית ה-cache, לפי גרסת המאגר,
+#   כך שכתובות שחוזרות משנה לשנה מפוענחות בשאילתה אחת בלי חיפוש מקורב. הכתובת עצמה לא נשמרת:
+#   המפתח הוא SHA-256 של השאילתה, והערך – שם היישוב בלבד. שורות של גרסאות מאגר אחרות נמחקות.
+import hashlib
+import re
+import sqlite3
+from math import sin, cos, tan, sqrt, radians, degrees
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .instrument import count
+
+# מספר שגיאות הקלדה מותר לפי אורך השם (בלי רווחים): עד 3 אותיות – 0, עד 8 – 1, יותר – 2
+FUZZY_EDITS = ((3, 0), (8, 1))
+FUZZY_MAX_EDITS = 2
+_RESOLVER_VERSION = "2"   # להעלות כשמשנים את אופן הפענוח – מבטל את ה-cache הקיים
+
+_QUOTES = re.compile(r"[\"'`׳״“”]")
+_SEPARATORS = re.compile(r"[-–—_.()]+")
+_ADDRESS_PARTS = re.compile(r"\s*[,|/]\s*|\s+-\s+")
+
+def normalize_place(name: str) -> str:
+    name = _QUOTES.sub("", str(name or ""))
+    return " ".join(_SEPARATORS.sub(" ", name).split())
+
+def place_skeleton(key: str) -> str:
+    # בלי אמות קריאה (ו/י) ובלי רווחים – לכתיב מלא/חסר
+    return re.sub(r"[וי\s]", "", key)
+
+def allowed_edits(key: str) -> int:
+    n = len(key.replace(" ", ""))
+    return next((k for limit, k in FUZZY_EDITS if n <= limit), FUZZY_MAX_EDITS)
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    # לוונשטיין בפס ברוחב limit; limit + 1 = "רחוק יותר מ-limit"
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return min(prev[-1], limit + 1)
+
+# ====== קובץ היישובים של הלמ"ס ======
+# רשת ישראל החדשה (ITM): מרקטור רוחבי על אליפסואיד GRS80
+_ITM = dict(a=6378137.0, f=1 / 298.257222101, k0=1.0000067,
+            lat0=radians(31.7343936111), lon0=radians(35.2045169444), fe=219529.584, fn=626907.390)
+CBS_NAME_COLUMNS = ("שם יישוב", "שם_ישוב", "שם ישוב", "שם_יישוב")
+CBS_COORD_COLUMNS = ("קואורדינטות", "קואורדינטה")
+
+def _meridian_arc(phi: float, e2: float, a: float) -> float:
+    e4, e6 = e2 * e2, e2 ** 3
+    return a * ((1 - e2 / 4 - 3 * e4 / 64 - 5 * e6 / 256) * phi
+                - (3 * e2 / 8 + 3 * e4 / 32 + 45 * e6 / 1024) * sin(2 * phi)
+                + (15 * e4 / 256 + 45 * e6 / 1024) * sin(4 * phi)
+                - (35 * e6 / 3072) * sin(6 * phi))
+
+def itm_to_wgs84(x: float, y: float) -> Tuple[float, float]:
+    # (מזרח, צפון) במטרים → (קו רוחב, קו אורך). בלי הזזת דאטום (עשרות מטרים – זניח לרצועות המרחק)
+    p = _ITM
+    a, e2 = p["a"], p["f"] * (2 - p["f"])
+    ep2 = e2 / (1 - e2)
+    m = _meridian_arc(p["lat0"], e2, a) + (y - p["fn"]) / p["k0"]
+    mu = m / (a * (1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256))
+    e1 = (1 - sqrt(1 - e2)) / (1 + sqrt(1 - e2))
+    phi1 = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * sin(2 * mu)
+            + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * sin(4 * mu)
+            + (151 * e1 ** 3 / 96) * sin(6 * mu) + (1097 * e1 ** 4 / 512) * sin(8 * mu))
+    c1, t1 = ep2 * cos(phi1) ** 2, tan(phi1) ** 2
+    n1 = a / sqrt(1 - e2 * sin(phi1) ** 2)
+    r1 = a * (1 - e2) / (1 - e2 * sin(phi1) ** 2) ** 1.5
+    d = (x - p["fe"]) / (n1 * p["k0"])
+    lat = phi1 - (n1 * tan(phi1) / r1) * (
+        d ** 2 / 2 - (5 + 3 * t1 + 10 * c1 - 4 * c1 ** 2 - 9 * ep2) * d ** 4 / 24
+        + (61 + 90 * t1 + 298 * c1 + 45 * t1 ** 2 - 252 * ep2 - 3 * c1 ** 2) * d ** 6 / 720)
+    lon = p["lon0"] + (d - (1 + 2 * t1 + c1) * d ** 3 / 6
+                       + (5 - 2 * c1 + 28 * t1 - 3 * c1 ** 2 + 8 * ep2 + 24 * t1 ** 2) * d ** 5 / 120) / cos(phi1)
+    return round(degrees(lat), 5), round(degrees(lon), 5)
+
+def parse_cbs_coordinate(value) -> Optional[Tuple[float, float]]:
+    # 10 ספרות: 5 של מזרח ו-5 של צפון, ביחידות של 10 מ' (למשל 1780066375 → 178000, 663750)
+    try:
+        digits = f"{int(float(value)):010d}"
+    except (TypeError, ValueError):
+        return None
+    if len(digits) != 10 or int(digits) == 0:
+        return None
+    return itm_to_wgs84(int(digits[:5]) * 10.0, int(digits[5:]) * 10.0)
+
+def _read_frame(path: str) -> pd.DataFrame:
+    if Path(path).suffix.lower() in (".xlsx", ".xls"):
+        return pd.read_excel(path, dtype=str)
+    try:
+        return pd.read_csv(path, dtype=str, encoding="utf-8-sig")
+    except UnicodeDecodeError:
+        return pd.read_csv(path, dtype=str, encoding="cp1255")   # קובצי הלמ"ס הישנים
+
+def _first_column(df: pd.DataFrame, names: Sequence[str]) -> Optional[str]:
+    cols = {" ".join(str(c).split()): c for c in df.columns}
+    return next((cols[n] for n in names if n in cols), None)
+
+def read_localities(path: str) -> Tuple[Dict[str, Tuple[float, float]], Dict[str, List[str]]]:
+    # קובץ מאגר → (קואורדינטות, כינויים). שורות בלי שם או בלי קואורדינטות תקינות מדולגות
+    df = _read_frame(path).fillna("")
+    coords: Dict[str, Tuple[float, float]] = {}
+    aliases: Dict[str, List[str]] = {}
+    cbs_name, cbs_coord = _first_column(df, CBS_NAME_COLUMNS), _first_column(df, CBS_COORD_COLUMNS)
+    if "name" in df.columns:
+        for row in df.itertuples(index=False):
+            name = " ".join(str(row.name).split())
+            try:
+                coords[name] = (float(row.lat), float(row.lon))
+            except (AttributeError, ValueError):
+                continue
+            extra = [a.strip() for a in str(getattr(row, "aliases", "")).split("|") if a.strip()]
+            if extra:
+                aliases[name] = extra
+    elif cbs_name and cbs_coord:
+        for name, value in zip(df[cbs_name], df[cbs_coord]):
+            name, point = " ".join(str(name).split()), parse_cbs_coordinate(value)
+            if name and point:
+                coords[name] = point
+    else:
+        raise ValueError(f"{path}: לא נמצאו עמודות name,lat,lon או שם יישוב + קואורדינטות (למ\"ס)")
+    coords.pop("", None)
+    return coords, aliases
+
+class Gazetteer:
+    def __init__(self, coords: Dict[str, Tuple[float, float]], aliases: Optional[Dict[str, List[str]]] = None):
+        self.coords = dict(coords)
+        self.aliases = {name: list(a) for name, a in (aliases or {}).items()}
+        self._index: Dict[str, str] = {}
+        skeletons: Dict[str, set] = {}
+        for name in self.coords:
+            for alias in [name] + self.aliases.get(name, []):
+                key = normalize_place(alias)
+                if key:
+                    self._index.setdefault(key, name)
+                    skeletons.setdefault(place_skeleton(key), set()).add(name)
+        # שלד שמתאים ליותר מיישוב אחד, או קצר מ-3 אותיות (למשל "יפו" → "פ"), לא משמש להתאמה
+        self._skeleton = {k: next(iter(v)) for k, v in skeletons.items() if len(v) == 1 and len(k) >= 3}
+        self._keys = list(self._index)
+        digest = hashlib.sha256(_RESOLVER_VERSION.encode())
+        for name in sorted(self.coords):
+            digest.update(f"{name}|{self.coords[name]}|{sorted(self.aliases.get(name, []))}\n".encode())
+        self.version = digest.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, paths: Union[None, str, Sequence[Optional[str]]], coords: Dict[str, Tuple[float, float]],
+             aliases: Optional[Dict[str, List[str]]] = None) -> "Gazetteer":
+        # הקבצים נטענים לפי הסדר; יישוב שמופיע שוב מקבל את הקואורדינטות מהקובץ האחרון
+        coords = dict(coords)
+        aliases = {name: list(a) for name, a in (aliases or {}).items()}
+        for path in ([paths] if isinstance(paths, (str, Path)) else paths or []):
+            if not path:
+                continue
+            more, extra = read_localities(str(path))
+            coords.update(more)
+            for name, a in extra.items():
+                aliases[name] = aliases.get(name, []) + a
+        return cls(coords, aliases)
+
+    def lookup(self, name: str, fuzzy: bool = True) -> Optional[str]:
+        key = normalize_place(name)
+        if not key:
+            return None
+        hit = self._index.get(key) or self._skeleton.get(place_skeleton(key))
+        if hit or not fuzzy:
+            return hit
+        limit = allowed_edits(key)
+        if limit == 0:
+            return None
+        best, found = limit + 1, set()
+        for cand in self._keys:
+            d = edit_distance(key, cand, min(limit, best))
+            if d < best:
+                best, found = d, {self._index[cand]}
+            elif d == best and d <= limit:
+                found.add(self._index[cand])
+        return next(iter(found)) if best <= limit and len(found) == 1 else None
+
+    def find_in_address(self, address: str) -> Optional[str]:
+        # מהחלק האחרון של הכתובת לראשון; בכל חלק – החלק כולו ואז רצפי מילים בסופו ובתחילתו
+        parts = [p for p in _ADDRESS_PARTS.split(str(address or "").strip()) if p.strip()]
+        for part in reversed(parts):
+            toks = part.split()
+            candidates = [part] + [" ".join(toks[-n:]) for n in range(min(len(toks) - 1, 4), 0, -1)] \
+                + [" ".join(toks[:n]) for n in range(min(len(toks) - 1, 4), 0, -1)]
+            for cand in candidates:
+                hit = self.lookup(cand, fuzzy=False)
+                if hit:
+                    return hit
+        return self.lookup(parts[-1]) if parts else None
+
+# ====== cache מתמשך של פענוחים ======
+def query_key(kind: str, query: str) -> str:
+    # טביעת אצבע לשאילתה (אחרי איחוד רווחים) – במקום הכתובת עצמה
+    return hashlib.sha256(f"{kind}\x1f{' '.join(str(query).split())}".encode("utf-8")).hexdigest()
+
+def _connect(db_path: Path, version: str) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        with conn:
+            # טבלה ישנה ששמרה את הכתובות כטקסט – נמחקת, ו-VACUUM מנקה אותן גם מהדפים הפנויים
+            legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'geocode'").fetchone()
+            conn.execute("DROP TABLE IF EXISTS geocode")
+            conn.execute("CREATE TABLE IF NOT EXISTS places ("
+                         " version TEXT NOT NULL, key TEXT NOT NULL, city TEXT NOT NULL,"
+                         " PRIMARY KEY (version, key)) WITHOUT ROWID")
+            stale = conn.execute("DELETE FROM places WHERE version != ?", (version,)).rowcount
+        if legacy or stale:
+            conn.execute("VACUUM")
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+def resolve_places(gaz: Gazetteer, queries: Iterable[str], kind: str = "city",
+                   db_path: Optional[Path] = None) -> Dict[str, str]:
+    # query → שם קנוני ("" אם לא נמצא). kind: "city" (שם יישוב) או "address" (כתובת מלאה)
+    todo = [q for q in dict.fromkeys(queries) if q]
+    keys = {q: query_key(kind, q) for q in todo}
+    found: Dict[str, str] = {}
+    conn = None
+    if db_path is not None and todo:
+        try:
+            conn = _connect(db_path, gaz.version)
+            unique = list(dict.fromkeys(keys.values()))
+            cities: Dict[str, str] = {}
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                cities.update(conn.execute(
+                    f"SELECT key, city FROM places WHERE version = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [gaz.version, *chunk]).fetchall())
+            found = {q: cities[k] for q, k in keys.items() if k in cities}
+        except (sqlite3.Error, OSError):
+            if conn is not None:
+                conn.close()
+            conn = None   # אין הרשאת כתיבה / קובץ נעול – פענוח בלי cache
+    count("geocode_cache_hits", len(found))
+
+    missing = [q for q in todo if q not in found]
+    resolve = gaz.find_in_address if kind == "address" else gaz.lookup
+    fresh = {q: resolve(q) or "" for q in missing}
+    count("geocode_resolved", len(fresh))
+    found.update(fresh)
+    if conn is not None:
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO places VALUES (?, ?, ?)",
+                                 [(gaz.version, keys[q], c) for q, c in fresh.items()])
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    return found
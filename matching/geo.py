@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# קואורדינטות ערים ומרחקים
+import os
+from functools import lru_cache
+from pathlib import Path
+from math import radians, sin, cos, sqrt, atan2
+from typing import Optional, List, Dict, Iterable
+
+import numpy as np
+
+from .files import CACHE_DIR
+from .gazetteer import Gazetteer, resolve_places
+
+# ===== רשימת קואורדינטות ערים בישראל (ניתן להרחיב כרצונך) =====
+cities_coords = {
+    "תל אביב": (32.0853, 34.7818),
+    "ירושלים": (31.7683, 35.2137),
+    "חיפה": (32.7940, 34.9896),
+    "רמת גן": (32.0684, 34.8248),
+    "גבעתיים": (32.0700, 34.8089),
+    "בת ים": (32.0171, 34.7454),
+    "חולון": (32.0158, 34.7874),
+    "פתח תקווה": (32.0840, 34.8878),
+    "ראשון לציון": (31.9710, 34.7894),
+    "רחובות": (31.8948, 34.8113),
+    "נתניה": (32.3215, 34.8532),
+    "הרצליה": (32.1663, 34.8439),
+    "מודיעין": (31.8980, 35.0104),
+    "אשדוד": (31.8014, 34.6436),
+    "באר שבע": (31.2520, 34.7915),
+    "עכו": (32.9234, 35.0827),
+    "נהריה": (33.0058, 35.0940),
+    "כרמיאל": (32.9171, 35.3050),
+    "צפת": (32.9646, 35.4960),
+    "נוף הגליל": (32.7019, 35.3033),
+    "טבריה": (32.7922, 35.5312),
+    "גוליס": (33.0330, 35.3160),  # יישוב קטן לדוגמה
+}
+
+# כינויים וכתיב חלופי לערים המובנות
+city_aliases = {
+    "תל אביב": ["תל אביב יפו", "תל אביב-יפו", "ת\"א", "יפו"],
+    "פתח תקווה": ["פ\"ת"],
+    "ראשון לציון": ["ראשל\"צ"],
+    "באר שבע": ["ב\"ש"],
+    "נוף הגליל": ["נצרת עילית"],
+    "מודיעין": ["מודיעין מכבים רעות", "מודיעין-מכבים-רעות"],
+}
+
+# ===== מאגר היישובים הפעיל =====
+# הרשימה המובנית + data/localities.csv (כ-100 יישובים נוספים, קואורדינטות משוערות של מרכז היישוב)
+# + קובץ מאגר אופציונלי (MATCH_GAZETTEER, למשל קובץ היישובים של הלמ"ס); פענוחים נשמרים ב-geocode.sqlite
+LOCALITIES_PATH = Path(__file__).parent / "data" / "localities.csv"
+GAZETTEER_PATH = os.environ.get("MATCH_GAZETTEER")
+GEOCODE_DB = CACHE_DIR / "geocode.sqlite"
+
+@lru_cache(maxsize=1)
+def gazetteer() -> Gazetteer:
+    return Gazetteer.load([LOCALITIES_PATH, GAZETTEER_PATH], cities_coords, city_aliases)
+
+def set_gazetteer_path(path: Optional[str]) -> Gazetteer:
+    global GAZETTEER_PATH
+    GAZETTEER_PATH = path
+    gazetteer.cache_clear()
+    city_distance_matrix.cache_clear()
+    city_band_matrix.cache_clear()
+    return gazetteer()
+
+def canonical_cities(values: Iterable[str], kind: str = "city") -> Dict[str, str]:
+    # ערך → שם היישוב הקנוני במאגר ("" אם לא נמצא)
+    return resolve_places(gazetteer(), values, kind, GEOCODE_DB)
+
+# ===== פונקציות מרחק בין ערים =====
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0  # ק"מ
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return R * c
+
+def city_distance_km(city1: str, city2: str) -> Optional[float]:
+    city1 = (city1 or "").strip()
+    city2 = (city2 or "").strip()
+    if not city1 or not city2:
+        return None
+    if city1 == city2:
+        return 0.0
+    coords = gazetteer().coords
+    if city1 not in coords or city2 not in coords:
+        return None
+    lat1, lon1 = coords[city1]
+    lat2, lon2 = coords[city2]
+    return haversine(lat1, lon1, lat2, lon2)
+
+# ===== מטריצת מרחקים מחושבת מראש =====
+# כל עיר מקבלת מזהה שלם, והמרחקים בין כל זוגות הערים מחושבים פעם אחת (haversine וקטורי).
+# המטריצה נשמרת ב-cache ברמת התהליך (גם בין ריצות חוזרות של Streamlit), כך שבדיקות הקרבה
+# הן חיפוש במערך. המערכים המוחזרים לקריאה בלבד.
+# "רצועת קרבה" לכל זוג: 3 = עד 5 ק"מ, 2 = עד 20, 1 = עד 50, 0 = רחוק יותר או לא ידוע.
+def haversine_matrix(lat1, lon1, lat2, lon2) -> np.ndarray:
+    R = 6371.0  # ק"מ
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def intern_cities(*columns: List[str]):
+    # מילון ערים משותף לכל העמודות + מערך מזהים לכל עמודה
+    vocab: dict = {}
+    ids = [np.array([vocab.setdefault(c, len(vocab)) for c in col], dtype=np.int64) for col in columns]
+    return list(vocab), ids
+
+@lru_cache(maxsize=32)
+def city_distance_matrix(cities: tuple) -> np.ndarray:
+    # אותה סמנטיקה כמו city_distance_km: NaN = לא ידוע, עיר זהה = 0
+    known = gazetteer().coords
+    coords = np.array([known.get(c, (np.nan, np.nan)) for c in cities], dtype=float).reshape(-1, 2)
+    lat, lon = coords[:, 0], coords[:, 1]
+    dist = haversine_matrix(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    names = np.array(cities, dtype=object)
+    dist[names[:, None] == names[None, :]] = 0.0
+    empty = names == ""
+    dist[empty, :] = np.nan
+    dist[:, empty] = np.nan
+    dist.flags.writeable = False
+    return dist
+
+@lru_cache(maxsize=32)
+def city_band_matrix(cities: tuple) -> np.ndarray:
+    dist = city_distance_matrix(cities)
+    with np.errstate(invalid="ignore"):
+        band = np.select([dist <= 5, dist <= 20, dist <= 50], [3, 2, 1], default=0).astype(np.int8)
+    band.flags.writeable = False
+    return band
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# היסטוריית שיבוצים רב-שנתית: כל ריצה נשמרת בקובץ SQLite מקומי – טביעות האצבע של קבצי הקלט,
+# המשקולות, המנוע, וכל השיבוצים עם הציונים. על טבלת השיבוצים יש אינדקסים לפי ת"ז, מקום ומדריך,
+# כך ששאלות כמו "לאילו מדריכים היו סטודנטים בשנה שעברה" או "איפה הסטודנט שובץ בעבר" עונות
+# בשאילתה אחת בלי לקרוא שוב גיליונות של שנים קודמות, ושיבוץ קודם משמש כהתחלה חמה (warm_match).
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from .engines import UNASSIGNED, assignment_stats
+from .instrument import timed
+
+HISTORY_DB = Path(os.environ.get("MATCH_HISTORY_DB", "match_history.sqlite"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    year INTEGER NOT NULL,
+    engine TEXT NOT NULL,
+    weights TEXT NOT NULL,
+    students_fp TEXT,
+    sites_fp TEXT,
+    n_students INTEGER NOT NULL,
+    total REAL NOT NULL,
+    unassigned INTEGER NOT NULL,
+    note TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    stu_id TEXT NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    site_name TEXT NOT NULL,
+    site_city TEXT NOT NULL,
+    site_field TEXT NOT NULL,
+    supervisor TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_year ON runs(year, created);
+CREATE INDEX IF NOT EXISTS assignments_run ON assignments(run_id);
+CREATE INDEX IF NOT EXISTS assignments_student ON assignments(stu_id);
+CREATE INDEX IF NOT EXISTS assignments_site ON assignments(site_name);
+CREATE INDEX IF NOT EXISTS assignments_supervisor ON assignments(supervisor);
+"""
+
+# עמודות טבלת התוצאה → עמודות טבלת השיבוצים
+RESULT_COLUMNS = {
+    "ת\"ז הסטודנט": "stu_id",
+    "שם פרטי": "first_name",
+    "שם משפחה": "last_name",
+    "שם מקום ההתמחות": "site_name",
+    "עיר המוסד": "site_city",
+    "תחום ההתמחות במוסד": "site_field",
+    "שם המדריך": "supervisor",
+    "אחוז התאמה": "score",
+}
+
+def connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    db_path = Path(db_path or HISTORY_DB)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _query(sql: str, params: tuple = (), db_path: Optional[Path] = None) -> pd.DataFrame:
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+@timed("history_save")
+def save_run(result_df: pd.DataFrame, engine: str, W=None, students_fp: Optional[str] = None,
+             sites_fp: Optional[str] = None, year: Optional[int] = None, run_id: Optional[str] = None,
+             note: str = "", db_path: Optional[Path] = None) -> str:
+    run_id = run_id or uuid.uuid4().hex[:12]
+    year = int(year or time.localtime().tm_year)
+    stats = assignment_stats(result_df)
+    rows = pd.DataFrame({dst: (result_df[src] if src in result_df.columns else "")
+                         for src, dst in RESULT_COLUMNS.items()})
+    text_cols = [c for c in rows.columns if c != "score"]
+    rows[text_cols] = rows[text_cols].astype(str)
+    rows["score"] = pd.to_numeric(rows["score"], errors="coerce").fillna(0.0)
+    rows.insert(0, "run_id", run_id)
+
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                run_id, time.time(), year, engine, json.dumps(asdict(W) if W is not None else {}),
+                students_fp, sites_fp, len(result_df), stats["total"], stats["unassigned"], note))
+            conn.execute("DELETE FROM assignments WHERE run_id = ?", (run_id,))
+            conn.executemany("INSERT INTO assignments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             rows.itertuples(index=False, name=None))
+    finally:
+        conn.close()
+    return run_id
+
+def list_runs(year: Optional[int] = None, db_path: Optional[Path] = None) -> pd.DataFrame:
+    where, params = ("WHERE year = ?", (int(year),)) if year is not None else ("", ())
+    return _query(f"SELECT * FROM runs {where} ORDER BY created DESC", params, db_path)
+
+def find_run(students_fp: str, sites_fp: str, db_path: Optional[Path] = None) -> Optional[str]:
+    # הריצה האחרונה על אותם קבצי קלט בדיוק
+    runs = _query("SELECT run_id FROM runs WHERE students_fp = ? AND sites_fp = ? ORDER BY created DESC LIMIT 1",
+                  (students_fp, sites_fp), db_path)
+    return runs["run_id"].iloc[0] if len(runs) else None
+
+def latest_run(year: int, db_path: Optional[Path] = None) -> Optional[str]:
+    runs = _query("SELECT run_id FROM runs WHERE year = ? ORDER BY created DESC LIMIT 1", (int(year),), db_path)
+    return runs["run_id"].iloc[0] if len(runs) else None
+
+def delete_run(run_id: str, db_path: Optional[Path] = None) -> None:
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+    finally:
+        conn.close()
+
+def load_run(run_id: str, db_path: Optional[Path] = None) -> pd.DataFrame:
+    # בחזרה לעמודות טבלת התוצאה של האפליקציה
+    df = _query("SELECT * FROM assignments WHERE run_id = ? ORDER BY rowid", (run_id,), db_path)
+    return df.drop(columns="run_id").rename(columns={v: k for k, v in RESULT_COLUMNS.items()})
+
+# ====== שאילתות ======
+# "השיבוץ של שנה" = הריצה האחרונה שנשמרה לאותה שנה
+_YEAR_RUN = "(SELECT run_id FROM runs WHERE year = ? ORDER BY created DESC LIMIT 1)"
+
+def supervisors_with_students(year: int, db_path: Optional[Path] = None) -> pd.DataFrame:
+    return _query(
+        "SELECT supervisor AS 'שם המדריך', site_name AS 'שם מקום ההתמחות', COUNT(*) AS 'כמה סטודנטים'"
+        f" FROM assignments WHERE run_id = {_YEAR_RUN} AND site_name != ? AND supervisor != ''"
+        " GROUP BY supervisor, site_name ORDER BY supervisor",
+        (int(year), UNASSIGNED), db_path)
+
+def student_history(stu_id: str, db_path: Optional[Path] = None) -> pd.DataFrame:
+    return _query(
+        "SELECT r.year AS 'שנה', a.site_name AS 'שם מקום ההתמחות', a.supervisor AS 'שם המדריך',"
+        " a.score AS 'אחוז התאמה', r.run_id"
+        " FROM assignments a JOIN runs r USING (run_id) WHERE a.stu_id = ? ORDER BY r.created DESC",
+        (str(stu_id),), db_path)
+
+def site_history(site_name: str, db_path: Optional[Path] = None) -> pd.DataFrame:
+    return _query(
+        "SELECT r.year AS 'שנה', COUNT(*) AS 'כמה סטודנטים', AVG(a.score) AS 'ציון ממוצע', r.run_id"
+        " FROM assignments a JOIN runs r USING (run_id) WHERE a.site_name = ?"
+        " GROUP BY r.run_id ORDER BY r.created DESC",
+        (str(site_name),), db_path)
+
+def supervisor_history(supervisor: str, db_path: Optional[Path] = None) -> pd.DataFrame:
+    return _query(
+        "SELECT r.year AS 'שנה', a.site_name AS 'שם מקום ההתמחות', COUNT(*) AS 'כמה סטודנטים', r.run_id"
+        " FROM assignments a JOIN runs r USING (run_id) WHERE a.supervisor = ?"
+        " GROUP BY r.run_id, a.site_name ORDER BY r.created DESC",
+        (str(supervisor),), db_path)
+
+def prior_placements(run_id: str, db_path: Optional[Path] = None) -> Dict[str, str]:
+    # ת"ז → שם מקום, להתחלה חמה (warm_match); סטודנטים שלא שובצו לא נכללים
+    df = _query("SELECT stu_id, site_name FROM assignments WHERE run_id = ? AND site_name != ?",
+                (run_id, UNASSIGNED), db_path)
+    return dict(zip(df["stu_id"], df["site_name"]))
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# שיבוץ מצטבר: אחרי ריצה מלאה נשמרים השיבוץ ומטריצת הציונים (MatchState). כשמעלים קבצים
+# מעודכנים (שינוי קיבולת, סטודנט שעזב, סטודנט שנוסף) rematch:
+# 1) מתאים שורות לפי ת"ז הסטודנט / שם המוסד, ומחשב ציונים מחדש רק לשורות ולעמודות
+#    שהשדות המשפיעים על הציון שלהן השתנו – השאר מועתק מהמטריצה הקודמת;
+# 2) משאיר במקומו כל סטודנט שלא השתנה ושהאתר שלו לא השתנה;
+# 3) משחרר סטודנטים רק כשחורגים מהקיבולת או ממכסת המדריך (הציון הנמוך ביותר משוחרר ראשון);
+# 4) משבץ מחדש רק את הסטודנטים הפנויים מול הקיבולת שנותרה, באותו מנוע כמו הריצה המלאה.
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .engines import ASSIGN_ENGINES, MAX_PER_SUPERVISOR, assignment_to_frame, _supervisor_codes
+from .instrument import timed, stage, count
+from .resolve import str_values
+from .scoring import Weights, score_matrix
+
+STU_SCORE_FIELDS = ["stu_pref", "stu_req", "stu_city", "stu_partner"]  # כולל בן/בת זוג – שינוי בו משבץ מחדש
+SITE_SCORE_FIELDS = ["site_field", "site_city", "site_special"]
+
+@dataclass
+class MatchState:
+    engine: str
+    W: Weights
+    students: pd.DataFrame
+    sites: pd.DataFrame       # הקיבולת המקורית (לפני השיבוץ)
+    scores: np.ndarray
+    assign: np.ndarray        # מיקום אתר לכל סטודנט, -1 = לא שובץ
+    stu_keys: List[str]
+    site_keys: List[str]
+    stu_sig: List[tuple]
+    site_sig: List[tuple]
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])   # מפתח cache לתוצאות נגזרות
+
+def entity_keys(ids: List[str]) -> List[str]:
+    # מפתח יציב לשורה; מזהה כפול מקבל סיומת לפי סדר ההופעה
+    seen: dict = {}
+    keys = []
+    for x in ids:
+        seen[x] = seen.get(x, 0) + 1
+        keys.append(x if seen[x] == 1 else f"{x}#{seen[x]}")
+    return keys
+
+def _signatures(df: pd.DataFrame, fields: List[str]) -> List[tuple]:
+    return list(zip(*(str_values(df, c) for c in fields)))
+
+def _new_state(engine, W, students, sites, scores, assign) -> MatchState:
+    return MatchState(
+        engine=engine, W=W, students=students, sites=sites, scores=scores, assign=assign,
+        stu_keys=entity_keys(str_values(students, "stu_id")),
+        site_keys=entity_keys(str_values(sites, "site_name")),
+        stu_sig=_signatures(students, STU_SCORE_FIELDS),
+        site_sig=_signatures(sites, SITE_SCORE_FIELDS),
+    )
+
+@timed("full_match")
+def full_match(students: pd.DataFrame, sites: pd.DataFrame, W: Weights, engine: str = "greedy",
+               scores: Optional[np.ndarray] = None) -> Tuple[MatchState, pd.DataFrame]:
+    if scores is None:
+        scores = score_matrix(students, sites, W)
+    assign = ASSIGN_ENGINES[engine](students, sites, scores)
+    return _new_state(engine, W, students, sites, scores, assign), assignment_to_frame(students, sites, scores, assign, W.min_score)
+
+def _align(old_keys: List[str], new_keys: List[str], old_sig: List[tuple], new_sig: List[tuple]):
+    pos = {k: i for i, k in enumerate(old_keys)}
+    old_idx = np.array([pos.get(k, -1) for k in new_keys], dtype=np.int64)
+    same = np.array([i >= 0 and old_sig[i] == sig for i, sig in zip(old_idx.tolist(), new_sig)], dtype=bool)
+    return old_idx, same
+
+def _release_excess(assign: np.ndarray, scores: np.ndarray, group: np.ndarray, limit: np.ndarray) -> int:
+    # group[j] = קבוצת האתר (האתר עצמו או המדריך שלו); בקבוצה שחורגת מ-limit משוחררים
+    # הסטודנטים בעלי הציון הנמוך ביותר (בשוויון – המאוחר בקובץ)
+    placed = np.flatnonzero(assign >= 0)
+    g = group[assign[placed]]
+    load = np.bincount(g, minlength=len(limit))
+    released = 0
+    for k in np.flatnonzero(load > limit):
+        members = placed[g == k]
+        order = np.lexsort((-members, scores[members, assign[members]]))
+        drop = members[order[:load[k] - max(int(limit[k]), 0)]]
+        assign[drop] = -1
+        released += len(drop)
+    return released
+
+def repair_assignment(students: pd.DataFrame, sites: pd.DataFrame, scores: np.ndarray,
+                      assign: np.ndarray, engine: str) -> dict:
+    # assign (במקום) מכיל שיבוצים קיימים; משחררים חריגות מקיבולת / ממכסת מדריך ומשבצים את הפנויים
+    m = len(sites)
+    capacity = sites["capacity_left"].to_numpy().astype(int)
+    sup, sup_u = _supervisor_codes(sites)
+    released = _release_excess(assign, scores, np.arange(m), capacity)
+    released += _release_excess(assign, scores, sup, np.full(len(sup_u), MAX_PER_SUPERVISOR))
+    kept_count = int((assign >= 0).sum())
+
+    # שיבוץ הסטודנטים הפנויים מול הקיבולת שנותרה
+    free = np.flatnonzero(assign < 0)
+    used = np.bincount(assign[assign >= 0], minlength=m)
+    residual = sites.copy()
+    residual["capacity_left"] = capacity - used
+    sup_load = dict(zip(sup_u, np.bincount(sup[assign[assign >= 0]], minlength=len(sup_u)).tolist()))
+    if len(free):
+        assign[free] = ASSIGN_ENGINES[engine](students.iloc[free], residual, scores[free], sup_load)
+    count("released", released)
+    count("kept", kept_count)
+    return {"kept": kept_count, "released": released,
+            "placed": int((assign[free] >= 0).sum()) if len(free) else 0}
+
+@timed("rematch")
+def rematch(prev: MatchState, students: pd.DataFrame, sites: pd.DataFrame,
+            W: Optional[Weights] = None) -> Tuple[MatchState, pd.DataFrame, dict]:
+    W = W or prev.W
+    stu_keys = entity_keys(str_values(students, "stu_id"))
+    site_keys = entity_keys(str_values(sites, "site_name"))
+    stu_sig = _signatures(students, STU_SCORE_FIELDS)
+    site_sig = _signatures(sites, SITE_SCORE_FIELDS)
+    stu_old, stu_same = _align(prev.stu_keys, stu_keys, prev.stu_sig, stu_sig)
+    site_old, site_same = _align(prev.site_keys, site_keys, prev.site_sig, site_sig)
+    if W != prev.W:
+        stu_same[:] = False
+
+    with stage("rescore"):
+        n, m = len(students), len(sites)
+        scores = np.empty((n, m), dtype=np.float64)
+        if stu_same.any() and site_same.any():
+            scores[np.ix_(stu_same, site_same)] = prev.scores[np.ix_(stu_old[stu_same], site_old[site_same])]
+        rows = np.flatnonzero(~stu_same)
+        cols = np.flatnonzero(~site_same)
+        if len(rows):
+            scores[rows] = score_matrix(students.iloc[rows], sites, W)
+        if len(cols) and stu_same.any():
+            scores[np.ix_(stu_same, cols)] = score_matrix(students[stu_same], sites.iloc[cols], W)
+        count("rescored_students", len(rows))
+        count("rescored_sites", len(cols))
+
+    with stage("repair"):
+        # שיבוץ קודם נשמר לסטודנט שלא השתנה, באתר שלא השתנה
+        old_to_new_site = np.full(len(prev.site_keys), -1, dtype=np.int64)
+        old_to_new_site[site_old[site_old >= 0]] = np.flatnonzero(site_old >= 0)
+        assign = np.full(n, -1, dtype=np.int64)
+        kept = np.flatnonzero(stu_same)
+        prev_site = prev.assign[stu_old[kept]]
+        new_site = np.where(prev_site >= 0, old_to_new_site[np.maximum(prev_site, 0)], -1)
+        ok = new_site >= 0
+        ok[ok] = site_same[new_site[ok]]
+        assign[kept[ok]] = new_site[ok]
+        repair = repair_assignment(students, sites, scores, assign, prev.engine)
+
+    stats = {"rescored_students": int(len(rows)), "rescored_sites": int(len(cols)), **repair}
+    state = MatchState(engine=prev.engine, W=W, students=students, sites=sites, scores=scores, assign=assign,
+                       stu_keys=stu_keys, site_keys=site_keys, stu_sig=stu_sig, site_sig=site_sig)
+    return state, assignment_to_frame(students, sites, scores, assign, W.min_score), stats
+
+@timed("warm_match")
+def warm_match(students: pd.DataFrame, sites: pd.DataFrame, W: Weights, prior: Dict[str, str],
+               engine: str = "greedy", scores: Optional[np.ndarray] = None) -> Tuple[MatchState, pd.DataFrame, dict]:
+    # התחלה חמה משיבוץ קודם (למשל מההיסטוריה): prior = ת"ז → שם מקום. סטודנט שהמקום הקודם
+    # שלו קיים גם עכשיו מתחיל בו, והשאר – כמו בשיבוץ מצטבר (שחרור חריגות ושיבוץ הפנויים)
+    if scores is None:
+        scores = score_matrix(students, sites, W)
+    site_pos: Dict[str, int] = {}
+    for j, name in enumerate(str_values(sites, "site_name")):
+        site_pos.setdefault(name, j)
+    assign = np.array([site_pos.get(prior.get(sid, ""), -1) for sid in str_values(students, "stu_id")],
+                      dtype=np.int64)
+    count("warm_start", int((assign >= 0).sum()))
+    with stage("repair"):
+        stats = repair_assignment(students, sites, scores, assign, engine)
+    return _new_state(engine, W, students, sites, scores, assign), assignment_to_frame(students, sites, scores, assign, W.min_score), stats
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# מדידת ביצועים לכל שלב בצינור השיבוץ.
+# Metrics אוסף זמנים, מונים ושיא זיכרון (אופציונלי, tracemalloc) לכל שלב, ואפשר גם cProfile
+# לכל הריצה. פונקציות הליבה מסומנות ב-@timed / stage() ומדווחות רק כשיש Metrics פעיל
+# (metrics.activate()); אחרת העלות היא בדיקה אחת של ContextVar.
+# את התוצאה אפשר להציג כטבלה (to_frame) או לכתוב כשורות JSON לקובץ לוג (emit_jsonl).
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+_ACTIVE: ContextVar[Optional["Metrics"]] = ContextVar("matching_metrics", default=None)
+
+class Metrics:
+    def __init__(self, label: str = "run", profile: bool = False, trace_memory: bool = False):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.stages: List[dict] = []
+        self.counters: Dict[str, float] = {}
+        self.profile_stats: Optional[pstats.Stats] = None
+        self._stack: List[dict] = []
+
+    @contextmanager
+    def activate(self):
+        token = _ACTIVE.set(self)
+        profiler = cProfile.Profile() if self.profile else None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profile_stats = pstats.Stats(profiler, stream=io.StringIO())
+            if started_tracing:
+                tracemalloc.stop()
+            _ACTIVE.reset(token)
+
+    @contextmanager
+    def stage(self, name: str):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # שיא הזיכרון של שלב אב נשמר לפני שתת-שלב מאפס אותו
+            if self._stack:
+                self._stack[-1]["child_peak"] = max(self._stack[-1]["child_peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        record = {"stage": name, "depth": len(self._stack), "seconds": 0.0, "peak_mb": None, "counters": {}}
+        frame = {"record": record, "child_peak": 0}
+        self.stages.append(record)
+        self._stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - t0
+            self._stack.pop()
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+                record["peak_mb"] = peak / 2**20
+                if self._stack:
+                    self._stack[-1]["child_peak"] = max(self._stack[-1]["child_peak"], peak)
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self._stack:
+            c = self._stack[-1]["record"]["counters"]
+            c[name] = c.get(name, 0) + value
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = [{
+            "שלב": "  " * r["depth"] + r["stage"],
+            "זמן (שניות)": round(r["seconds"], 4),
+            "שיא זיכרון (MB)": None if r["peak_mb"] is None else round(r["peak_mb"], 1),
+            "מונים": ", ".join(f"{k}={v:g}" for k, v in r["counters"].items()),
+        } for r in self.stages]
+        return pd.DataFrame(rows, columns=["שלב", "זמן (שניות)", "שיא זיכרון (MB)", "מונים"])
+
+    def total_seconds(self) -> float:
+        return sum(r["seconds"] for r in self.stages if r["depth"] == 0)
+
+    def profile_text(self, top: int = 25, sort: str = "cumulative") -> str:
+        if self.profile_stats is None:
+            return ""
+        out = io.StringIO()
+        self.profile_stats.stream = out
+        self.profile_stats.sort_stats(sort).print_stats(top)
+        return out.getvalue()
+
+    def records(self) -> List[dict]:
+        base = {"run_id": self.run_id, "label": self.label, "started": self.started}
+        lines = [{**base, "type": "stage", **r} for r in self.stages]
+        lines.append({**base, "type": "run", "seconds": self.total_seconds(), "counters": self.counters})
+        return lines
+
+    def emit_jsonl(self, path) -> None:
+        with open(path, "a", encoding="utf-8") as f:
+            for rec in self.records():
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+def active() -> Optional[Metrics]:
+    return _ACTIVE.get()
+
+@contextmanager
+def stage(name: str):
+    metrics = _ACTIVE.get()
+    if metrics is None:
+        yield None
+        return
+    with metrics.stage(name) as record:
+        yield record
+
+def count(name: str, value: float = 1) -> None:
+    metrics = _ACTIVE.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+def timed(name: str):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _ACTIVE.get() is None:
+                return fn(*args, **kwargs)
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# עבודות רקע: השיבוץ רץ ב-thread pool משותף לכל המשתמשים בשרת, והאפליקציה שומרת רק
+# את מזהה העבודה (job_id) ב-session_state. לכל עבודה יש שלבים במשקלים קבועים מראש,
+# וקוד הליבה מדווח התקדמות בתוך שלב (progress) – מזה מחושבים פס ההתקדמות וזמן הסיום המשוער.
+# ביטול הוא שיתופי: כל קריאה ל-progress בודקת את דגל הביטול וזורקת JobCancelled.
+# מחוץ לעבודת רקע progress ו-job_step לא עושים כלום (בדיקה אחת של ContextVar).
+# העבודות הן threads באותו תהליך, והמנועים הם Python טהור: עבודות שרצות יחד חולקות ליבה אחת (GIL),
+# ולכן JOB_WORKERS קטן, ועבודות נוספות ממתינות בתור (queue_position). חישוב הציונים לבדו יכול
+# לרוץ בתהליכים נפרדים (MATCH_WORKERS, ראו parallel).
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+JOB_WORKERS = int(os.environ.get("MATCH_JOB_WORKERS", "2"))   # עבודות שרצות במקביל; השאר ממתינות בתור
+# עבודה שהסתיימה נשמרת עד שהמשתמש אוסף את התוצאה – אבל לא יותר מ-JOB_RESULT_TTL שניות ולא יותר
+# מ-MAX_FINISHED_JOBS עבודות: התוצאה כוללת את מטריצת הציונים המלאה (סטודנטים × אתרים)
+MAX_FINISHED_JOBS = 8
+JOB_RESULT_TTL = float(os.environ.get("MATCH_JOB_TTL", "600"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+_CURRENT: ContextVar[Optional["Job"]] = ContextVar("matching_job", default=None)
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, label: str = "match", phases: Optional[Dict[str, float]] = None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.phases = dict(phases or {})
+        self.status = QUEUED
+        self.phase = ""
+        self.fraction = 0.0          # התקדמות בתוך השלב הנוכחי
+        self._done_weight = 0.0      # סכום משקלי השלבים שהסתיימו
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def progress(self) -> float:
+        if self.status == DONE:
+            return 1.0
+        total = sum(self.phases.values()) or 1.0
+        current = self.phases.get(self.phase, 0.0) * self.fraction
+        return min((self._done_weight + current) / total, 1.0)
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def eta_seconds(self) -> Optional[float]:
+        p = self.progress
+        if self.status != RUNNING or p < 0.02:
+            return None
+        return self.elapsed() * (1 - p) / p
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def check(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.job_id)
+
+    def update(self, done: float, total: float) -> None:
+        self.fraction = min(done / total, 1.0) if total else 1.0
+        self.check()
+
+    @contextmanager
+    def step(self, name: str):
+        self.check()
+        self.phase, self.fraction = name, 0.0
+        try:
+            yield self
+        finally:
+            self._done_weight += self.phases.get(name, 0.0)
+            self.fraction = 0.0
+
+# ====== דיווח מתוך קוד הליבה ======
+def current_job() -> Optional[Job]:
+    return _CURRENT.get()
+
+def progress(done: float, total: float) -> None:
+    job = _CURRENT.get()
+    if job is not None:
+        job.update(done, total)
+
+@contextmanager
+def job_step(name: str):
+    job = _CURRENT.get()
+    if job is None:
+        yield None
+    else:
+        with job.step(name):
+            yield job
+
+# ====== תור העבודות ======
+_LOCK = threading.Lock()
+_JOBS: "OrderedDict[str, Job]" = OrderedDict()
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(JOB_WORKERS, 1), thread_name_prefix="match-job")
+        return _EXECUTOR
+
+def _run(job: Job, fn: Callable, args: tuple, kwargs: dict) -> None:
+    token = _CURRENT.set(job)
+    job.status, job.started = RUNNING, time.time()
+    try:
+        job.check()
+        job.result = fn(*args, **kwargs)
+        job.status = DONE
+    except JobCancelled:
+        job.status = CANCELLED
+    except Exception as e:
+        job.error, job.status = e, FAILED
+    finally:
+        job.finished = time.time()
+        _CURRENT.reset(token)
+
+def _prune() -> None:
+    # נקרא עם _LOCK: עבודות שהסתיימו מזמן, או מעבר ל-MAX_FINISHED_JOBS, נמחקות עם התוצאה שלהן
+    now = time.time()
+    finished = [k for k, j in _JOBS.items() if j.done]
+    expired = {k for k in finished if now - (_JOBS[k].finished or now) > JOB_RESULT_TTL}
+    expired.update(finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)])
+    for k in expired:
+        del _JOBS[k]
+
+def submit(fn: Callable, *args, label: str = "match", phases: Optional[Dict[str, float]] = None, **kwargs) -> Job:
+    job = Job(label, phases)
+    with _LOCK:
+        _prune()
+        _JOBS[job.job_id] = job
+    _executor().submit(_run, job, fn, args, kwargs)
+    return job
+
+def get_job(job_id: Optional[str]) -> Optional[Job]:
+    with _LOCK:
+        _prune()
+        return _JOBS.get(job_id) if job_id else None
+
+def queue_position(job: Job) -> int:
+    # כמה עבודות ממתינות בתור לפני העבודה הזו (0 – הבאה בתור או כבר רצה)
+    with _LOCK:
+        if job.status != QUEUED:
+            return 0
+        return sum(1 for j in _JOBS.values() if j.status == QUEUED and j.submitted < job.submitted)
+
+def forget_job(job_id: Optional[str]) -> None:
+    with _LOCK:
+        _JOBS.pop(job_id, None)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# בני/בנות זוג להכשרה: סטודנטים שמבקשים להיות יחד משובצים כיחידה אחת – שני מקומות באותו אתר,
+# אצל אותו מדריך. העמודה "בן/בת זוג להכשרה" יכולה להכיל ת"ז או שם מלא של בן/בת הזוג;
+# ההתאמה נעשית בחיפוש במילון (ת"ז / "פרטי משפחה" / "משפחה פרטי" → שורות) ולא בסריקה של כל הסטודנטים.
+import numpy as np
+import pandas as pd
+
+from .resolve import str_values
+
+def partner_pairs(students_df: pd.DataFrame) -> np.ndarray:
+    # מערך (k, 2) של מיקומי שורות; כל סטודנט לכל היותר בזוג אחד.
+    # זוג נוצר כש-A מציין את B, ו-B לא מציין מישהו אחר (ציון הדדי או חד-צדדי).
+    partners = str_values(students_df, "stu_partner")
+    if not any(partners):
+        return np.empty((0, 2), dtype=np.int64)
+    ids = str_values(students_df, "stu_id")
+    first = str_values(students_df, "stu_first")
+    last = str_values(students_df, "stu_last")
+
+    by_id: dict = {}
+    by_name: dict = {}
+    for i, (sid, f, l) in enumerate(zip(ids, first, last)):
+        if sid:
+            by_id.setdefault(sid, i)
+        for key in {f"{f} {l}".strip(), f"{l} {f}".strip()} - {""}:
+            by_name.setdefault(key, []).append(i)
+
+    # קודם הפניות לפי ת"ז (חד-ערכיות); שם שמופיע אצל כמה סטודנטים מוכרע לטובת מי שמפנה חזרה
+    refs = [" ".join(p.split()) for p in partners]
+    target = [by_id.get(p, -1) if p else -1 for p in refs]
+    for i, p in enumerate(refs):
+        if target[i] >= 0 or not p:
+            continue
+        cands = [j for j in by_name.get(p, []) if j != i]
+        back = [j for j in cands if target[j] == i]
+        target[i] = back[0] if back else (cands[0] if len(cands) == 1 else -1)
+    target = [-1 if j == i else j for i, j in enumerate(target)]
+
+    paired = np.zeros(len(partners), dtype=bool)
+    pairs = []
+    for i, j in enumerate(target):
+        if j < 0 or paired[i] or paired[j] or target[j] not in (-1, i):
+            continue
+        paired[i] = paired[j] = True
+        pairs.append((min(i, j), max(i, j)))
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
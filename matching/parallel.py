@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# חישוב מטריצת הציונים במקביל על כמה ליבות.
+# הסטודנטים מחולקים למקטעים, וכל מקטע מנוקד מול טבלת האתרים המשותפת ב-ProcessPoolExecutor.
+# עמודות האתרים נארזות פעם אחת לזיכרון משותף (SharedMemory) ונקראות ע"י כל תהליך באתחול,
+# וכל מקטע כותב את שורותיו ישירות למטריצת פלט משותפת – אין pickle של האתרים או של התוצאות
+# לכל משימה. כל מקטע מחושב ע"י score_matrix עצמה, ולכן התוצאה זהה לחישוב הסדרתי.
+# התהליכים נוצרים ב-spawn ולא ב-fork: fork מתוך שרת עם threads (Streamlit, תור העבודות) מעתיק
+# נעילות שתפוסות ע"י threads אחרים, והתהליך החדש עלול להיתקע עליהן.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import geo
+from .resolve import str_values
+from .scoring import Weights, score_matrix
+from .instrument import timed, count
+from .jobs import progress
+
+STU_SCORE_COLS = ["stu_pref", "stu_req", "stu_city"]
+SITE_SCORE_COLS = ["site_field", "site_city", "site_special"]
+MIN_CHUNK = 256  # מתחת לזה – חישוב סדרתי, התקורה של תהליכים לא משתלמת
+MP_START_METHOD = "spawn"
+
+def process_context():
+    return multiprocessing.get_context(MP_START_METHOD)
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    # None → משתנה הסביבה MATCH_WORKERS (ברירת מחדל 1), 0 → כל הליבות
+    if workers is None:
+        workers = int(os.environ.get("MATCH_WORKERS", "1"))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def _pack_strings(values: List[str]) -> SharedMemory:
+    # פריסה: [מספר מחרוזות][היסטים int64][בתים UTF-8]
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = b"".join(encoded)
+    start = 8 + offsets.nbytes
+    shm = SharedMemory(create=True, size=start + len(blob))
+    shm.buf[:8] = np.int64(len(encoded)).tobytes()
+    shm.buf[8:start] = offsets.tobytes()
+    shm.buf[start:start + len(blob)] = blob
+    return shm
+
+def _unpack_strings(buf) -> List[str]:
+    n = int(np.frombuffer(bytes(buf[:8]), dtype=np.int64)[0])
+    start = 8 + 8 * (n + 1)
+    offsets = np.frombuffer(bytes(buf[8:start]), dtype=np.int64).tolist()
+    raw = bytes(buf[start:start + offsets[-1]])
+    return [raw[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+_WORKER: dict = {}
+
+def _init_worker(sites_name: str, out_name: str, shape, W: Weights, gazetteer_path: Optional[str]) -> None:
+    # תהליך spawn מתחיל מהגדרות ברירת המחדל – מאגר יישובים שהוחלף בתהליך הראשי עובר במפורש
+    if gazetteer_path != geo.GAZETTEER_PATH:
+        geo.set_gazetteer_path(gazetteer_path)
+    sites_shm = SharedMemory(name=sites_name)
+    values = _unpack_strings(sites_shm.buf)
+    sites_shm.close()
+    m = shape[1]
+    _WORKER["sites"] = pd.DataFrame({c: values[k * m:(k + 1) * m] for k, c in enumerate(SITE_SCORE_COLS)})
+    _WORKER["out_shm"] = SharedMemory(name=out_name)
+    _WORKER["out"] = np.ndarray(shape, dtype=np.float64, buffer=_WORKER["out_shm"].buf)
+    _WORKER["W"] = W
+
+def _score_chunk(start: int, chunk: pd.DataFrame) -> int:
+    _WORKER["out"][start:start + len(chunk)] = score_matrix(chunk, _WORKER["sites"], _WORKER["W"])
+    return start
+
+@timed("parallel_score_matrix")
+def parallel_score_matrix(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                          workers: Optional[int] = None, chunk_size: Optional[int] = None) -> np.ndarray:
+    workers = resolve_workers(workers)
+    n, m = len(students_df), len(sites_df)
+    if workers <= 1 or n < 2 * MIN_CHUNK or m == 0:
+        return score_matrix(students_df, sites_df, W)
+
+    chunk_size = chunk_size or max(MIN_CHUNK, -(-n // (workers * 4)))
+    count("workers", workers)
+    students = pd.DataFrame({c: str_values(students_df, c) for c in STU_SCORE_COLS})
+    sites_shm = _pack_strings([v for c in SITE_SCORE_COLS for v in str_values(sites_df, c)])
+    out_shm = SharedMemory(create=True, size=n * m * 8)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context(), initializer=_init_worker,
+                                 initargs=(sites_shm.name, out_shm.name, (n, m), W, geo.GAZETTEER_PATH)) as pool:
+            futures = [pool.submit(_score_chunk, start, students.iloc[start:start + chunk_size])
+                       for start in range(0, n, chunk_size)]
+            done = 0
+            try:
+                for f in as_completed(futures):
+                    done += min(chunk_size, n - f.result())
+                    progress(done, n)
+            except BaseException:
+                # ביטול העבודה: לא מחכים לחלקים שעוד לא התחילו
+                for f in futures:
+                    f.cancel()
+                raise
+        out = np.ndarray((n, m), dtype=np.float64, buffer=out_shm.buf).copy()
+    finally:
+        sites_shm.close()
+        sites_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+    return out
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# זיהוי עמודות בקבצי הקלט ונרמול לשמות פנימיים (stu_* / site_*)
+import re
+from typing import Optional, Any, List
+
+import pandas as pd
+
+from .instrument import timed
+from .geo import canonical_cities
+
+# עמודות סטודנטים
+STU_COLS = {
+    "id": ["מספר תעודת זהות", "תעודת זהות", "ת\"ז", "תז", "תעודת זהות הסטודנט"],
+    "first": ["שם פרטי"],
+    "last": ["שם משפחה"],
+    "address": ["כתובת", "כתובת הסטודנט", "רחוב"],
+    "city": ["עיר מגורים", "עיר"],
+    "phone": ["טלפון", "מספר טלפון"],
+    "email": ["דוא\"ל", "דוא״ל", "אימייל", "כתובת אימייל", "כתובת מייל"],
+    "preferred_field": ["תחום מועדף","תחומים מועדפים"],
+    "special_req": ["בקשה מיוחדת"],
+    "partner": ["בן/בת זוג להכשרה", "בן\\בת זוג להכשרה", "בן/בת זוג", "בן\\בת זוג"]
+}
+
+# עמודות אתרים
+SITE_COLS = {
+    "name": ["מוסד / שירות הכשרה", "מוסד", "שם מוסד ההתמחות", "שם המוסד", "מוסד ההכשרה"],
+    "field": ["תחום ההתמחות", "תחום התמחות"],
+    "street": ["רחוב"],
+    "city": ["עיר"],
+    "capacity": ["מספר סטודנטים שניתן לקלוט השנה", "מספר סטודנטים שניתן לקלוט", "קיבולת"],
+    "sup_first": ["שם פרטי"],
+    "sup_last": ["שם משפחה"],
+    "phone": ["טלפון"],
+    "email": ["אימייל", "כתובת מייל", "דוא\"ל", "דוא״ל"],
+    "review": ["חוות דעת מדריך"],
+    # ננסה לאתר עמודת "בקשות מיוחדות" אם קיימת בקובץ האתרים
+    "special": ["בקשות מיוחדות", "בקשה מיוחדת", "דרישות מיוחדות"]
+}
+
+def pick_col(df: pd.DataFrame, options: List[str]) -> Optional[str]:
+    for opt in options:
+        if opt in df.columns: return opt
+    return None
+
+def normalize_text(x: Any) -> str:
+    if x is None: return ""
+    return str(x).strip()
+
+# ===== חילוץ עיר מהכתובת (אם אין עמודת "עיר") =====
+def extract_city(address: str) -> str:
+    if pd.isna(address):
+        return ""
+    address = str(address).strip()
+    parts = re.split(r'[,|/|-]', address)
+    if len(parts) > 1:
+        return parts[-1].strip()
+    toks = address.split()
+    return toks[-1].strip() if toks else ""
+
+# ===== מודל פנימי רזה =====
+# מהקבצים הגולמיים נשמרות רק העמודות שהשיבוץ צריך (בלי טלפון, אימייל, חוות דעת וכו').
+# הנרמול נעשה על עמודה שלמה בבת אחת, ועמודות עם ערכים חוזרים (עיר, תחום, מדריך)
+# נשמרות כ-Categorical – קוד שלם לכל שורה ומילון ערכים אחד.
+STU_FIELDS = ["stu_id", "stu_first", "stu_last", "stu_city", "stu_pref", "stu_req", "stu_partner"]
+SITE_FIELDS = ["site_name", "site_field", "site_city", "site_capacity", "capacity_left", "site_special", "שם המדריך"]
+CATEGORY_FIELDS = ["stu_city", "stu_pref", "site_field", "site_city", "שם המדריך"]
+
+def normalize_column(col: pd.Series) -> pd.Series:
+    # כמו normalize_text לעמודה שלמה; תא ריק (None/NaN) הופך ל-""
+    return col.astype("string").fillna("").str.strip()
+
+def _text_column(df: pd.DataFrame, col: Optional[str]) -> pd.Series:
+    if col is None:
+        return pd.Series("", index=df.index, dtype="string")
+    return normalize_column(df[col])
+
+def _canonical_city(col: pd.Series, kind: str = "city") -> pd.Series:
+    # שם היישוב הקנוני ממאגר היישובים (כל ערך ייחודי פעם אחת, דרך ה-cache המתמשך);
+    # עיר שלא נמצאה נשארת כפי שנכתבה, ומכתובת שלא נמצאה לוקחים את החלק האחרון (extract_city)
+    uniq = col.unique().tolist()
+    found = canonical_cities(uniq, kind)
+    fallback = extract_city if kind == "address" else (lambda v: v)
+    return col.map({v: found.get(v) or fallback(v) for v in uniq}).astype("string")
+
+def _categorize(out: pd.DataFrame) -> pd.DataFrame:
+    for c in CATEGORY_FIELDS:
+        if c in out.columns:
+            out[c] = out[c].astype("category")
+    return out
+
+# ----- סטודנטים -----
+@timed("resolve_students")
+def resolve_students(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=df.index)
+    out["stu_id"]    = normalize_column(df[pick_col(df, STU_COLS["id"])])
+    out["stu_first"] = normalize_column(df[pick_col(df, STU_COLS["first"])])
+    out["stu_last"]  = normalize_column(df[pick_col(df, STU_COLS["last"])])
+
+    city_col = pick_col(df, STU_COLS["city"])
+    if city_col:
+        out["stu_city"] = _canonical_city(normalize_column(df[city_col]))
+    else:
+        addr_col = pick_col(df, STU_COLS["address"])
+        out["stu_city"] = _canonical_city(normalize_column(df[addr_col]), "address") if addr_col else _text_column(df, None)
+
+    out["stu_pref"] = _text_column(df, pick_col(df, STU_COLS["preferred_field"]))
+    out["stu_req"]  = _text_column(df, pick_col(df, STU_COLS["special_req"]))
+    out["stu_partner"] = _text_column(df, pick_col(df, STU_COLS["partner"]))
+    return _categorize(out[STU_FIELDS])
+
+# ----- אתרים -----
+@timed("resolve_sites")
+def resolve_sites(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=df.index)
+    out["site_name"]  = normalize_column(df[pick_col(df, SITE_COLS["name"])])
+    out["site_field"] = normalize_column(df[pick_col(df, SITE_COLS["field"])])
+    out["site_city"]  = _canonical_city(normalize_column(df[pick_col(df, SITE_COLS["city"])]))
+
+    cap_col = pick_col(df, SITE_COLS["capacity"])
+    out["site_capacity"] = pd.to_numeric(df[cap_col], errors="coerce").fillna(1).astype(int) if cap_col else 1
+    out["capacity_left"] = out["site_capacity"].astype(int)
+
+    sup_first = pick_col(df, SITE_COLS["sup_first"])
+    sup_last  = pick_col(df, SITE_COLS["sup_last"])
+    out["שם המדריך"] = _text_column(df, None)
+    if sup_first or sup_last:
+        ff = _text_column(df, sup_first)
+        ll = _text_column(df, sup_last)
+        out["שם המדריך"] = (ff + " " + ll).str.strip()
+
+    out["site_special"] = _text_column(df, pick_col(df, SITE_COLS["special"]))
+    return _categorize(out[SITE_FIELDS])
+
+# ----- גישה לעמודות מפוענחות -----
+def str_values(df: pd.DataFrame, col: str) -> List[str]:
+    if col not in df.columns:
+        return [""] * len(df)
+    return [str(x).strip() for x in df[col].tolist()]
+
+def factorize_values(values: List[str]):
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), sort=False)
+    return codes, list(uniques)
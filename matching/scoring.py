@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# מודל הניקוד: ציון לזוג סטודנט–אתר ומטריצת ציונים וקטורית
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .geo import city_distance_km, intern_cities, city_band_matrix
+from .resolve import str_values, factorize_values
+from .special import NEAR, RequestClassifier, default_classifier
+from .instrument import timed
+
+# ====== מודל ניקוד ======
+MIN_SCORE = 20  # ציון מינימלי לפי בקשתך
+
+# חלק מנקודות העיר לפי רצועת מרחק: מעל 50 ק"מ / עד 50 / עד 20 / עד 5 (1, 3, 5 נק' מתוך 5)
+CITY_BAND_SHARE = np.array([0.0, 0.2, 0.6, 1.0])
+
+@dataclass
+class Weights:
+    w_field: float = 0.50   # 50%
+    w_city: float = 0.05    # 5% (עד 5 נק')
+    w_special: float = 0.45 # 45%
+    min_score: float = MIN_SCORE
+
+    def points(self) -> Tuple[float, float, float]:
+        # משקל → נקודות מתוך 100 (תחום, בקשה מיוחדת, עיר); העיגול שומר על 0.05 → 5 בדיוק
+        return round(self.w_field * 100, 6), round(self.w_special * 100, 6), round(self.w_city * 100, 6)
+
+# ====== חישוב ציון מדויק לפי המשקולות ======
+def compute_score(stu: pd.Series, site: pd.Series, W: Weights) -> float:
+    stu_pref = str(stu.get("stu_pref", "")).strip()
+    site_field = str(site.get("site_field", "")).strip()
+    stu_req  = str(stu.get("stu_req", "")).strip()
+    site_special = str(site.get("site_special", "")).strip()
+    stu_city = str(stu.get("stu_city", "")).strip()
+    site_city = str(site.get("site_city", "")).strip()
+
+    field_pts, special_pts, city_pts = W.points()
+
+    # 1) תחום – 50 נק'
+    field_score = field_pts if (stu_pref and site_field and (stu_pref in site_field)) else 0
+
+    dist = city_distance_km(stu_city, site_city)
+
+    # 2) בקשה מיוחדת – 45 נק'
+    special_score = 0
+    classifier = default_classifier()
+    if classifier.classify(stu_req) == NEAR:
+        # אם הבקשה היא קרבה – נבדוק מרחק
+        if dist is not None and dist <= 20:
+            special_score = special_pts
+    elif stu_req:
+        # אם הבקשה היא אחרת – נבדוק התאמת טקסט למוסד
+        haystack = " ".join([site_special, site_field, site_city]).strip()
+        if classifier.matches(stu_req, haystack):
+            special_score = special_pts
+
+    # 3) עיר – עד 5 נק' בלבד
+    band = 0
+    if dist is not None:
+        if dist <= 5:
+            band = 3
+        elif dist <= 20:
+            band = 2
+        elif dist <= 50:
+            band = 1
+    city_score = city_pts * CITY_BAND_SHARE[band]
+
+    total = field_score + special_score + city_score
+
+    # ציון מינימלי 20
+    return float(max(total, W.min_score))
+
+# ====== מטריצת ציונים וקטורית (סטודנטים × אתרים) ======
+# אותו ציון כמו compute_score, אבל בבת אחת: כל עמודה מקודדת למספרים שלמים (factorize),
+# הבדיקות הטקסטואליות רצות רק על הערכים הייחודיים, והמטריצה נבנית באינדוקס NumPy.
+# הרכיבים (תחום / בקשה מיוחדת / רצועת מרחק) נשמרים בנפרד בקוד אחד לכל תא – uint8:
+#   code = 8*field + 4*special + band
+# והציון לפי משקולות כלשהן הוא טבלה של 16 ערכים לפי הקוד, כך שהשוואת תצורות משקלים
+# לא מחשבת את הרכיבים מחדש.
+N_CODES = 16
+def _pair_table(left: List[str], right: List[str], fn) -> np.ndarray:
+    tab = np.zeros((len(left), len(right)), dtype=bool)
+    for i, a in enumerate(left):
+        for j, b in enumerate(right):
+            tab[i, j] = fn(a, b)
+    return tab
+
+@timed("score_components")
+def score_components(students_df: pd.DataFrame, sites_df: pd.DataFrame,
+                     classifier: Optional[RequestClassifier] = None) -> np.ndarray:
+    classifier = classifier or default_classifier()
+    stu_pref   = str_values(students_df, "stu_pref")
+    stu_req    = str_values(students_df, "stu_req")
+    stu_city   = str_values(students_df, "stu_city")
+    site_field = str_values(sites_df, "site_field")
+    site_city  = str_values(sites_df, "site_city")
+    site_special = str_values(sites_df, "site_special")
+    haystack = [" ".join(t).strip() for t in zip(site_special, site_field, site_city)]
+
+    pref_c, pref_u = factorize_values(stu_pref)
+    req_c,  req_u  = factorize_values(stu_req)
+    field_c, field_u = factorize_values(site_field)
+    hay_c,  hay_u  = factorize_values(haystack)
+
+    # 1) תחום
+    field_tab = _pair_table(pref_u, field_u, lambda p, f: bool(p and f and p in f))
+    field_hit = field_tab[pref_c[:, None], field_c[None, :]]
+
+    # קרבה בין ערים – חיפוש במטריצת הרצועות של הערים הייחודיות
+    cities, (scity_id, tcity_id) = intern_cities(stu_city, site_city)
+    band = city_band_matrix(tuple(cities))[scity_id[:, None], tcity_id[None, :]]
+
+    # 2) בקשה מיוחדת (סיווג פעם אחת לכל בקשה ייחודית, התאמה טקסטואלית באוטומט)
+    req_is_near = classifier.is_near(req_u)
+    text_tab = classifier.text_hits(req_u, hay_u)
+    text_hit = text_tab[req_c[:, None], hay_c[None, :]]
+    special_hit = np.where(req_is_near[req_c][:, None], band >= 2, text_hit)
+
+    # 3) עיר – רצועת המרחק עצמה
+    code = band.astype(np.uint8)
+    code |= field_hit.astype(np.uint8) << 3
+    code |= special_hit.astype(np.uint8) << 2
+    return code
+
+def _code_basis() -> np.ndarray:
+    # שורה לכל קוד: [תחום, בקשה מיוחדת, חלק נקודות העיר]
+    codes = np.arange(N_CODES)
+    return np.stack([codes >> 3, (codes >> 2) & 1, CITY_BAND_SHARE[codes & 3]], axis=1).astype(float)
+
+def score_tables(weights: Sequence[Weights]) -> np.ndarray:
+    # טבלת ציון לכל קוד, לכל תצורת משקלים בבת אחת: (K×3 נקודות) @ (3×16) → K×16
+    points = np.array([W.points() for W in weights], dtype=float).reshape(-1, 3)
+    floors = np.array([W.min_score for W in weights], dtype=float)
+    return np.maximum(points @ _code_basis().T, floors[:, None])
+
+def scores_from_components(code: np.ndarray, W: Weights) -> np.ndarray:
+    return score_tables([W])[0][code]
+
+@timed("score_matrix")
+def score_matrix(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                 classifier: Optional[RequestClassifier] = None) -> np.ndarray:
+    return scores_from_components(score_components(students_df, sites_df, classifier), W)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ניתוח "בקשה מיוחדת": כל בקשה מסווגת פעם אחת (קרבה / טקסט / רשימת מילים מהקונפיגורציה),
+# וההתאמה מול האתרים נעשית באוטומט Aho-Corasick – מעבר אחד על הטקסט של כל אתר מוצא
+# את כל הבקשות (או מילות המפתח) שמופיעות בו, במקום לבדוק כל זוג בקשה–אתר בנפרד.
+import json
+import os
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# מילים שמסמנות בקשת קרבה (לעומת בקשה טקסטואלית)
+NEAR_WORDS = ["קרוב", "קרבה", "סמוך", "בסביבה", "ליד"]
+
+NEAR = "near"   # בקשת קרבה – נבדקת לפי מרחק (עד 20 ק"מ)
+TEXT = "text"   # בקשה אחרת – הטקסט שלה צריך להופיע במוסד (בקשות מיוחדות / תחום / עיר)
+
+# רשימות מילות מפתח לפי סוג בקשה. רשימות נוספות נטענות מקובץ JSON (MATCH_KEYWORDS), למשל
+# {"near": ["קרוב", "ליד"], "נגישות": ["נגיש", "כיסא גלגלים"]}: בקשה שמכילה מילה מרשימה
+# כזו מתאימה לכל מוסד שהטקסט שלו מכיל מילה כלשהי מאותה רשימה.
+DEFAULT_KEYWORDS = {NEAR: NEAR_WORDS}
+KEYWORDS_PATH = os.environ.get("MATCH_KEYWORDS")
+
+def load_keywords(path: Optional[str] = None) -> Dict[str, List[str]]:
+    keywords = {k: list(v) for k, v in DEFAULT_KEYWORDS.items()}
+    path = path or KEYWORDS_PATH
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for kind, words in json.load(f).items():
+                keywords[kind] = [str(w).strip() for w in words if str(w).strip()]
+    return keywords
+
+# ====== אוטומט Aho-Corasick ======
+class KeywordAutomaton:
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(k for k in keywords if k))
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        for idx, word in enumerate(self.keywords):
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                node = nxt
+            self.out[node].append(idx)
+        # קישורי כישלון לפי BFS; כל צומת יורש את הפלט של צומת הכישלון שלו
+        queue = deque(self.goto[0].values())
+        while queue:
+            u = queue.popleft()
+            for ch, v in self.goto[u].items():
+                f = self.fail[u]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[v] = self.goto[f].get(ch, 0)
+                self.out[v] = self.out[v] + self.out[self.fail[v]]
+                queue.append(v)
+
+    def find(self, text: str) -> Set[int]:
+        # אינדקסי מילות המפתח שמופיעות ב-text (כתת-מחרוזת)
+        found: Set[int] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                found.update(self.out[node])
+        return found
+
+# ====== סיווג בקשות ואינדקס אתרים ======
+class RequestClassifier:
+    def __init__(self, keywords: Optional[Dict[str, List[str]]] = None):
+        self.keywords = keywords if keywords is not None else load_keywords()
+        # סדר הרשימות קובע עדיפות: קרבה קודמת לכל רשימה אחרת
+        self.kinds = sorted(self.keywords, key=lambda k: k != NEAR)
+        words, owner = [], []
+        for kind in self.kinds:
+            for w in self.keywords[kind]:
+                words.append(w); owner.append(kind)
+        self._auto = KeywordAutomaton(words)
+        self._owner = {i: owner[words.index(w)] for i, w in enumerate(self._auto.keywords)}
+        self._kind_cache: Dict[str, str] = {}
+
+    def kinds_in(self, text: str) -> Set[str]:
+        return {self._owner[i] for i in self._auto.find(text)}
+
+    def classify(self, req: str) -> str:
+        # "" = אין בקשה; אחרת סוג הבקשה לפי הרשימה הראשונה שיש לה מילה בבקשה, או TEXT
+        if not req:
+            return ""
+        kind = self._kind_cache.get(req)
+        if kind is None:
+            hits = self.kinds_in(req)
+            kind = self._kind_cache[req] = next((k for k in self.kinds if k in hits), TEXT)
+        return kind
+
+    def matches(self, req: str, haystack: str) -> bool:
+        # בדיקה לזוג בודד (compute_score); בקשות קרבה לא נבדקות כאן
+        kind = self.classify(req)
+        if not haystack or kind in ("", NEAR):
+            return False
+        if kind == TEXT:
+            return req in haystack
+        return kind in self.kinds_in(haystack)
+
+    def text_hits(self, requests: List[str], haystacks: List[str]) -> np.ndarray:
+        # hit[r, h] – האם סוג הבקשה r מתקיים במוסד h. לבקשת טקסט: הבקשה מופיעה ב-h;
+        # לבקשה מרשימת מילים: ב-h מופיעה מילה מאותה רשימה. בקשות קרבה נבדקות לפי מרחק.
+        hit = np.zeros((len(requests), len(haystacks)), dtype=bool)
+        kinds = [self.classify(r) for r in requests]
+        text_rows = [i for i, k in enumerate(kinds) if k == TEXT]
+        auto = KeywordAutomaton(requests[i] for i in text_rows)
+        row_of = {w: [] for w in auto.keywords}
+        for i in text_rows:
+            row_of[requests[i]].append(i)
+        list_rows = {k: [i for i, kk in enumerate(kinds) if kk == k] for k in self.kinds if k != NEAR}
+        for j, h in enumerate(haystacks):
+            if not h:
+                continue
+            for w in auto.find(h):
+                hit[row_of[auto.keywords[w]], j] = True
+            for k in self.kinds_in(h):
+                if list_rows.get(k):
+                    hit[list_rows[k], j] = True
+        return hit
+
+    def is_near(self, requests: List[str]) -> np.ndarray:
+        return np.array([self.classify(r) == NEAR for r in requests], dtype=bool)
+
+@lru_cache(maxsize=8)
+def default_classifier(path: Optional[str] = None) -> RequestClassifier:
+    return RequestClassifier(load_keywords(path))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# טבלאות התוצאה והסיכום לפי מקום הכשרה
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .instrument import timed
+
+SUMMARY_KEYS = ["שם מקום ההתמחות", "תחום ההתמחות במוסד", "שם המדריך"]
+SITE_KEYS = ["site_name", "site_field", "שם המדריך"]   # אותו מפתח בטבלת האתרים המפוענחת
+
+def order_result_columns(result_df: pd.DataFrame) -> pd.DataFrame:
+    # העברת תחום ההתמחות אחרי שם מקום ההתמחות
+    df_show = result_df.copy()
+    cols = list(df_show.columns)
+    if "תחום ההתמחות במוסד" in cols and "שם מקום ההתמחות" in cols:
+        cols.insert(cols.index("שם מקום ההתמחות")+1, cols.pop(cols.index("תחום ההתמחות במוסד")))
+        df_show = df_show[cols]
+    return df_show
+
+def _site_capacity(sites: pd.DataFrame, keys: pd.MultiIndex) -> pd.arrays.IntegerArray:
+    # קיבולת לכל שורת סיכום (סכום על אתרים כפולים באותו מפתח); 0 לשורה בלי אתר (לא שובצו);
+    # <NA> לכל השורות אם בטבלת האתרים אין עמודות קיבולת ומפתח
+    if not set(SITE_KEYS + ["site_capacity"]).issubset(sites.columns):
+        return pd.array([pd.NA] * len(keys), dtype="Int64")
+    frame = sites[SITE_KEYS].astype(str)
+    frame["site_capacity"] = pd.to_numeric(sites["site_capacity"], errors="coerce").fillna(0).to_numpy()
+    cap = frame.groupby(SITE_KEYS, sort=False)["site_capacity"].sum()
+    return pd.array(cap.reindex(keys).fillna(0).to_numpy(dtype=float).astype(np.int64), dtype="Int64")
+
+@timed("summary")
+def build_summary(result_df: pd.DataFrame, sites: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    # שם מלא מחושב פעם אחת לכל הטבלה; הסטודנטים ממוינים (מיון יציב) לפי קוד המקום, כך שכל מקום
+    # הוא רצף במערך השמות – המנייה היא bincount והצירוף הוא join על פרוסה (בלי רשימות ו-apply)
+    full_name = (result_df["שם פרטי"].astype(str) + " " + result_df["שם משפחה"].astype(str)).to_numpy(dtype=object)
+    grouped = result_df.groupby([result_df[k].astype(str) for k in SUMMARY_KEYS])
+    codes = grouped.ngroup().to_numpy()
+    counts = np.bincount(codes, minlength=grouped.ngroups)
+    ends = np.cumsum(counts)
+    names = full_name[np.argsort(codes, kind="stable")]
+    summary_df = pd.DataFrame({
+        "כמה סטודנטים": counts,
+        "המלצת שיבוץ": [" + ".join(names[e - c:e]) for c, e in zip(counts.tolist(), ends.tolist())],
+    }, index=grouped.size().index)
+
+    # ניצולת ועומס מדריך – על טבלת הסיכום עצמה (שורה לכל מקום), לא על כל הסטודנטים
+    if sites is not None:
+        cap = _site_capacity(sites, summary_df.index)
+        n = summary_df["כמה סטודנטים"].to_numpy(dtype=float)
+        summary_df["קיבולת"] = cap
+        # ניצולת רק לשורות עם קיבולת ידועה וחיובית
+        cap_f = cap.to_numpy(dtype=float, na_value=np.nan)
+        summary_df["ניצולת %"] = np.round(np.divide(100 * n, cap_f, out=np.full(len(n), np.nan),
+                                                    where=np.nan_to_num(cap_f) > 0), 1)
+    summary_df = summary_df.reset_index()
+    summary_df["סטודנטים למדריך"] = (
+        summary_df.groupby("שם המדריך", sort=False)["כמה סטודנטים"].transform("sum")
+        .where(summary_df["שם המדריך"] != "").astype("Int64")
+    )
+
+    cols = SUMMARY_KEYS + ["כמה סטודנטים", "המלצת שיבוץ", "סטודנטים למדריך"]
+    if sites is not None:
+        cols[4:4] = ["קיבולת", "ניצולת %"]
+    return summary_df[cols]
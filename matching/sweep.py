@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# השוואת תצורות משקלים (sweep): רכיבי הציון (תחום / בקשה מיוחדת / רצועת מרחק) מחושבים פעם אחת
+# למטריצת קודים אחת (score_components), וטבלאות הציון של כל התצורות נבנות במכפלת מטריצות אחת
+# (score_tables). השיבוץ של כל תצורה רץ בתהליך נפרד: מטריצת הקודים משותפת בזיכרון משותף
+# (SharedMemory, כמו ב-parallel), וכל תהליך בונה ממנה את מטריצת הציונים של התצורה שלו.
+# בטבלת ההשוואה: סך הציונים (לפי המשקולות של התצורה ולפי ברירת המחדל), לא שובצו, ומדדי הוגנות.
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .engines import ASSIGN_ENGINES
+from .instrument import timed, stage, count
+from .jobs import progress
+from .parallel import process_context, resolve_workers
+from .resolve import str_values
+from .scoring import MIN_SCORE, Weights, score_components, score_tables
+
+def weight_grid(fields: Sequence[float], specials: Sequence[float], cities: Sequence[float],
+                min_score: float = MIN_SCORE) -> List[Weights]:
+    return [Weights(w_field=f, w_city=c, w_special=s, min_score=min_score)
+            for f, s, c in product(fields, specials, cities)]
+
+def gini(values: np.ndarray) -> float:
+    # 0 = כולם קיבלו אותו ציון; קרוב ל-1 = הציונים מרוכזים אצל מעטים
+    x = np.sort(np.asarray(values, dtype=float))
+    if len(x) == 0 or x.sum() == 0:
+        return 0.0
+    ranks = np.arange(1, len(x) + 1)
+    return float((2 * ranks - len(x) - 1) @ x / (len(x) * x.sum()))
+
+_WORKER: dict = {}
+
+def _init_worker(code_name: str, shape, tables: np.ndarray, students: pd.DataFrame,
+                 sites: pd.DataFrame, engine: str) -> None:
+    _WORKER["shm"] = SharedMemory(name=code_name)
+    _WORKER["code"] = np.ndarray(shape, dtype=np.uint8, buffer=_WORKER["shm"].buf)
+    _WORKER.update(tables=tables, students=students, sites=sites, engine=engine)
+
+def _assign_config(k: int):
+    scores = _WORKER["tables"][k][_WORKER["code"]]
+    return k, ASSIGN_ENGINES[_WORKER["engine"]](_WORKER["students"], _WORKER["sites"], scores)
+
+def _run_parallel(code: np.ndarray, tables: np.ndarray, students, sites, engine: str, workers: int) -> List[np.ndarray]:
+    assigns: List[Optional[np.ndarray]] = [None] * len(tables)
+    shm = SharedMemory(create=True, size=max(code.nbytes, 1))
+    try:
+        np.ndarray(code.shape, dtype=np.uint8, buffer=shm.buf)[:] = code
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context(), initializer=_init_worker,
+                                 initargs=(shm.name, code.shape, tables, students, sites, engine)) as pool:
+            futures = [pool.submit(_assign_config, k) for k in range(len(tables))]
+            try:
+                for done, f in enumerate(as_completed(futures), 1):
+                    k, assign = f.result()
+                    assigns[k] = assign
+                    progress(done, len(tables))
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+    finally:
+        shm.close()
+        shm.unlink()
+    return assigns
+
+def _config_row(W: Weights, assign: np.ndarray, code: np.ndarray, table: np.ndarray,
+                baseline: np.ndarray, has_request: np.ndarray) -> dict:
+    placed = np.flatnonzero(assign >= 0)
+    cell = code[placed, assign[placed]]
+    own = np.zeros(len(assign))
+    own[placed] = table[cell]
+    special_hit = np.zeros(len(assign), dtype=bool)
+    special_hit[placed] = (cell >> 2) & 1
+    n_req = int(has_request.sum())
+    return {
+        "תחום": W.w_field, "בקשה מיוחדת": W.w_special, "עיר": W.w_city, "ציון מינימלי": W.min_score,
+        "סך הציונים": float(own.sum()),
+        "סך הציונים (משקולות ברירת מחדל)": float(baseline[cell].sum()),
+        "ציון ממוצע": float(own[placed].mean()) if len(placed) else 0.0,
+        "לא שובצו": int(len(assign) - len(placed)),
+        "התאמת תחום %": round(100 * float((cell >> 3).mean()), 1) if len(placed) else 0.0,
+        "בקשה מיוחדת נענתה %": round(100 * float(special_hit[has_request].mean()), 1) if n_req else None,
+        # מדדי ההוגנות – על המשובצים בלבד; מי שלא שובץ נספר ב"לא שובצו" ולא כציון 0
+        "עשירון תחתון": float(np.percentile(own[placed], 10)) if len(placed) else 0.0,
+        "ג'יני": round(gini(own[placed]), 4),
+    }
+
+@timed("sweep")
+def sweep(students: pd.DataFrame, sites: pd.DataFrame, weights: Sequence[Weights], engine: str = "greedy",
+          workers: Optional[int] = None) -> pd.DataFrame:
+    # טבלת השוואה – שורה לכל תצורת משקלים (בסך הציונים, סטודנט שלא שובץ תורם 0)
+    weights = list(weights)
+    code = score_components(students, sites)
+    tables = score_tables(weights + [Weights()])
+    tables, baseline = tables[:-1], tables[-1]
+    count("configs", len(weights))
+
+    workers = min(resolve_workers(workers), len(weights))
+    with stage("sweep_assign"):
+        if workers <= 1:
+            assigns = []
+            for k, table in enumerate(tables):
+                assigns.append(ASSIGN_ENGINES[engine](students, sites, table[code]))
+                progress(k + 1, len(tables))
+        else:
+            assigns = _run_parallel(code, tables, students, sites, engine, workers)
+
+    has_request = np.array([bool(r) for r in str_values(students, "stu_req")], dtype=bool)
+    rows = [_config_row(W, a, code, t, baseline, has_request) for W, a, t in zip(weights, assigns, tables)]
+    return pd.DataFrame(rows)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# מחולל נתונים סינתטיים: קבצי סטודנטים ואתרים בעברית, בשמות העמודות של STU_COLS/SITE_COLS,
+# עם ערים מ-cities_coords, תחומי התמחות ובקשות מיוחדות – לבדיקות ביצועים בכל גודל.
+import random
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .geo import cities_coords
+from .resolve import STU_COLS, SITE_COLS
+from .special import NEAR_WORDS
+
+FIELDS = [
+    "בריאות הנפש", "רווחה", "חינוך מיוחד", "זקנה", "נוער בסיכון", "מוגבלויות",
+    "התמכרויות", "משפחה", "קהילה", "בריאות", "תקון", "הגירה וקליטה",
+]
+FIRST_NAMES = ["רות", "יואב", "סמאח", "נועה", "מוחמד", "אורי", "תמר", "דניאל", "מיכל", "עומר", "לינא", "שירה"]
+LAST_NAMES = ["כהן", "לוי", "ח'ורי", "מזרחי", "פרץ", "ביטון", "אבו ריא", "שפירא", "דהן", "עזאם"]
+STREETS = ["הרצל", "ויצמן", "הנביאים", "בן גוריון", "העצמאות", "ז'בוטינסקי"]
+SITE_KINDS = ["מרכז", "מחלקת", "עמותת", "בית", "שירות"]
+SITE_SPECIALS = ["נגישות", "עבודה עם משפחות", "דוברי ערבית", "משמרות ערב"]
+
+def _special_request(rnd: random.Random) -> str:
+    kind = rnd.random()
+    if kind < 0.45:
+        return ""
+    if kind < 0.70:
+        return f"{rnd.choice(NEAR_WORDS)} לבית"
+    if kind < 0.85:
+        return rnd.choice(FIELDS)
+    if kind < 0.95:
+        return rnd.choice(SITE_SPECIALS)
+    return rnd.choice(list(cities_coords))
+
+def make_students(n: int, seed: int = 0, vary_columns: bool = True, pair_rate: float = 0.0) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    pick = (lambda key: rnd.choice(STU_COLS[key])) if vary_columns else (lambda key: STU_COLS[key][0])
+    cities = list(cities_coords)
+    # חלק מהקבצים עם עמודת עיר וחלק רק עם כתובת מלאה (נבדק דרך extract_city)
+    use_address = vary_columns and rnd.random() < 0.3
+    col = {k: pick(k) for k in ["id", "first", "last", "phone", "email", "preferred_field", "special_req", "partner"]}
+    col["city"] = STU_COLS["address"][0] if use_address else STU_COLS["city"][0]
+
+    rows = []
+    for i in range(n):
+        city = rnd.choice(cities)
+        rows.append({
+            col["first"]: rnd.choice(FIRST_NAMES),
+            col["last"]: rnd.choice(LAST_NAMES),
+            col["id"]: str(200000000 + i),
+            col["city"]: f"{rnd.choice(STREETS)} {rnd.randint(1, 120)}, {city}" if use_address else city,
+            col["phone"]: f"05{rnd.randint(0, 9)}{rnd.randint(1000000, 9999999)}",
+            col["email"]: f"student{i}@example.com",
+            col["preferred_field"]: rnd.choice(FIELDS) if rnd.random() < 0.9 else "",
+            col["special_req"]: _special_request(rnd),
+            col["partner"]: "",
+        })
+    # בני/בנות זוג: שורות סמוכות, אחד מציין ת"ז והשני שם מלא
+    if pair_rate > 0:
+        for i in range(0, n - 1, 2):
+            if rnd.random() < pair_rate:
+                rows[i][col["partner"]] = rows[i + 1][col["id"]]
+                rows[i + 1][col["partner"]] = f"{rows[i][col['first']]} {rows[i][col['last']]}"
+    return pd.DataFrame(rows)
+
+def make_sites(n: int, seed: int = 0, vary_columns: bool = True) -> pd.DataFrame:
+    rnd = random.Random(seed + 1)
+    pick = (lambda key: rnd.choice(SITE_COLS[key])) if vary_columns else (lambda key: SITE_COLS[key][0])
+    col = {k: pick(k) for k in ["name", "field", "capacity", "special"]}
+    col.update({k: SITE_COLS[k][0] for k in ["street", "city", "sup_first", "sup_last", "phone", "email", "review"]})
+    cities = list(cities_coords)
+    n_supervisors = max(1, int(n * 0.8))  # חלק מהמדריכים אחראים על יותר מאתר אחד
+
+    rows = []
+    for j in range(n):
+        field = rnd.choice(FIELDS)
+        city = rnd.choice(cities)
+        sup = rnd.randrange(n_supervisors)
+        rows.append({
+            col["name"]: f"{rnd.choice(SITE_KINDS)} {field} {city} {j}",
+            col["field"]: field,
+            col["street"]: f"{rnd.choice(STREETS)} {rnd.randint(1, 120)}",
+            col["city"]: city,
+            col["capacity"]: rnd.randint(1, 4),
+            col["sup_first"]: FIRST_NAMES[sup % len(FIRST_NAMES)],
+            col["sup_last"]: f"{LAST_NAMES[sup % len(LAST_NAMES)]} {sup}",
+            col["phone"]: f"0{rnd.randint(2, 9)}{rnd.randint(1000000, 9999999)}",
+            col["email"]: f"site{j}@example.org",
+            col["review"]: rnd.choice(["מדריך מצוין", "", "זקוקה לשיפור"]),
+            col["special"]: rnd.choice(SITE_SPECIALS) if rnd.random() < 0.3 else "",
+        })
+    return pd.DataFrame(rows)
+
+def default_site_count(n_students: int) -> int:
+    return min(max(n_students // 10, 10), 1000)
+
+def make_dataset(n_students: int, n_sites: Optional[int] = None, seed: int = 0,
+                 vary_columns: bool = True, pair_rate: float = 0.0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    n_sites = n_sites or default_site_count(n_students)
+    return (make_students(n_students, seed, vary_columns, pair_rate),
+            make_sites(n_sites, seed, vary_columns))
@@ -1,13 +1,24 @@
 # matcher_streamlit_beauty_rtl_v7_fixed.py
 # -*- coding: utf-8 -*-
-import re
+import os
+import sqlite3
+import time
 import streamlit as st
 import pandas as pd
-import numpy as np
-from io import BytesIO
-from dataclasses import dataclass
-from typing import Optional, Any, List
-from math import radians, sin, cos, sqrt, atan2
+
+from matching import (
+    Weights, file_fingerprint, read_table, resolve_students, resolve_sites,
+    parallel_score_matrix, greedy_match, optimal_match, assignment_stats,
+    order_result_columns, build_summary, EXPORT_MIME, frame_fingerprint, export_bytes,
+    Metrics, stage, full_match, rematch, submit_job, get_job, forget_job, job_step, queue_position,
+    site_alternatives, weight_grid, sweep, MIN_SCORE, warm_match,
+)
+from matching import history
+
+# מדדי ביצועים של ההרצה הנוכחית של הסקריפט (העלאות, סיכום, ייצוא);
+# מדדי לחיצת "בצע שיבוץ" נשמרים בנפרד ב-session_state["run_metrics"]
+METRICS_LOG = os.environ.get("MATCH_METRICS_LOG")
+page_metrics = Metrics(label="page")
 
 # =========================
 # קונפיגורציה כללית
@@ -97,272 +108,24 @@ label,.stMarkdown,.stText,.stCaption{ text-align:right!important; }
 st.markdown("<h1>מערכת שיבוץ סטודנטים – התאמה חכמה</h1>", unsafe_allow_html=True)
 st.markdown("<p style='text-align:center;color:#475569;margin-top:-8px;'>כאן משבצים סטודנטים למקומות התמחות בקלות, בהתבסס על תחום, עיר ובקשות.</p>", unsafe_allow_html=True)
 
-# ====== מודל ניקוד ======
-@dataclass
-class Weights:
-    w_field: float = 0.50   # 50%
-    w_city: float = 0.05    # 5% (עד 5 נק')
-    w_special: float = 0.45 # 45%
-
-MIN_SCORE = 20  # ציון מינימלי לפי בקשתך
-
-# עמודות סטודנטים
-STU_COLS = {
-    "id": ["מספר תעודת זהות", "תעודת זהות", "ת\"ז", "תז", "תעודת זהות הסטודנט"],
-    "first": ["שם פרטי"],
-    "last": ["שם משפחה"],
-    "address": ["כתובת", "כתובת הסטודנט", "רחוב"],
-    "city": ["עיר מגורים", "עיר"],
-    "phone": ["טלפון", "מספר טלפון"],
-    "email": ["דוא\"ל", "דוא״ל", "אימייל", "כתובת אימייל", "כתובת מייל"],
-    "preferred_field": ["תחום מועדף","תחומים מועדפים"],
-    "special_req": ["בקשה מיוחדת"],
-    "partner": ["בן/בת זוג להכשרה", "בן\\בת זוג להכשרה", "בן/בת זוג", "בן\\בת זוג"]
-}
+# ====== קריאת קבצים ופענוח – cache לפי טביעת האצבע של הקובץ ======
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_table(fingerprint: str, name: str, _data: bytes) -> pd.DataFrame:
+    return read_table(_data, name, fingerprint)
 
-# עמודות אתרים
-SITE_COLS = {
-    "name": ["מוסד / שירות הכשרה", "מוסד", "שם מוסד ההתמחות", "שם המוסד", "מוסד ההכשרה"],
-    "field": ["תחום ההתמחות", "תחום התמחות"],
-    "street": ["רחוב"],
-    "city": ["עיר"],
-    "capacity": ["מספר סטודנטים שניתן לקלוט השנה", "מספר סטודנטים שניתן לקלוט", "קיבולת"],
-    "sup_first": ["שם פרטי"],
-    "sup_last": ["שם משפחה"],
-    "phone": ["טלפון"],
-    "email": ["אימייל", "כתובת מייל", "דוא\"ל", "דוא״ל"],
-    "review": ["חוות דעת מדריך"],
-    # ננסה לאתר עמודת "בקשות מיוחדות" אם קיימת בקובץ האתרים
-    "special": ["בקשות מיוחדות", "בקשה מיוחדת", "דרישות מיוחדות"]
-}
+def load_upload(uploaded):
+    # מחזיר (טביעת אצבע, טבלה)
+    data = uploaded.getvalue()
+    fingerprint = file_fingerprint(data)
+    return fingerprint, load_table(fingerprint, uploaded.name or "", data)
 
-def pick_col(df: pd.DataFrame, options: List[str]) -> Optional[str]:
-    for opt in options:
-        if opt in df.columns: return opt
-    return None
-
-# ----- קריאת קבצים -----
-def read_any(uploaded) -> pd.DataFrame:
-    name = (uploaded.name or "").lower()
-    if name.endswith(".csv"):
-        return pd.read_csv(uploaded, encoding="utf-8-sig")
-    if name.endswith((".xlsx",".xls")):
-        return pd.read_excel(uploaded)
-    return pd.read_csv(uploaded, encoding="utf-8-sig")
-
-def normalize_text(x: Any) -> str:
-    if x is None: return ""
-    return str(x).strip()
-
-# ===== חילוץ עיר מהכתובת (אם אין עמודת "עיר") =====
-def extract_city(address: str) -> str:
-    if pd.isna(address):
-        return ""
-    address = str(address).strip()
-    parts = re.split(r'[,|/|-]', address)
-    if len(parts) > 1:
-        return parts[-1].strip()
-    toks = address.split()
-    return toks[-1].strip() if toks else ""
-
-# ----- סטודנטים -----
-def resolve_students(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["stu_id"]    = out[pick_col(out, STU_COLS["id"])]
-    out["stu_first"] = out[pick_col(out, STU_COLS["first"])]
-    out["stu_last"]  = out[pick_col(out, STU_COLS["last"])]
-
-    city_col = pick_col(out, STU_COLS["city"])
-    if city_col:
-        out["stu_city"] = out[city_col]
-    else:
-        addr_col = pick_col(out, STU_COLS["address"])
-        out["stu_city"] = out[addr_col].apply(extract_city) if addr_col else ""
-
-    pref_col = pick_col(out, STU_COLS["preferred_field"])
-    req_col  = pick_col(out, STU_COLS["special_req"])
-    out["stu_pref"] = out[pref_col] if pref_col else ""
-    out["stu_req"]  = out[req_col]  if req_col  else ""
-
-    for c in ["stu_id","stu_first","stu_last","stu_city","stu_pref","stu_req"]:
-        out[c] = out[c].apply(normalize_text)
-    return out
-
-# ----- אתרים -----
-def resolve_sites(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["site_name"]  = out[pick_col(out, SITE_COLS["name"])]
-    out["site_field"] = out[pick_col(out, SITE_COLS["field"])]
-    out["site_city"]  = out[pick_col(out, SITE_COLS["city"])]
-
-    cap_col = pick_col(out, SITE_COLS["capacity"])
-    out["site_capacity"] = pd.to_numeric(out[cap_col], errors="coerce").fillna(1).astype(int) if cap_col else 1
-    out["capacity_left"] = out["site_capacity"].astype(int)
-
-    sup_first = pick_col(out, SITE_COLS["sup_first"])
-    sup_last  = pick_col(out, SITE_COLS["sup_last"])
-    out["שם המדריך"] = ""
-    if sup_first or sup_last:
-        ff = out[sup_first] if sup_first else ""
-        ll = out[sup_last]  if sup_last else ""
-        out["שם המדריך"] = (ff.astype(str) + " " + ll.astype(str)).str.strip()
-
-    special_col = pick_col(out, SITE_COLS["special"])
-    out["site_special"] = out[special_col] if special_col else ""
-
-    for c in ["site_name","site_field","site_city","site_special","שם המדריך"]:
-        out[c] = out[c].apply(normalize_text)
-    return out
-
-# ===== רשימת קואורדינטות ערים בישראל (ניתן להרחיב כרצונך) =====
-cities_coords = {
-    "תל אביב": (32.0853, 34.7818),
-    "ירושלים": (31.7683, 35.2137),
-    "חיפה": (32.7940, 34.9896),
-    "רמת גן": (32.0684, 34.8248),
-    "גבעתיים": (32.0700, 34.8089),
-    "בת ים": (32.0171, 34.7454),
-    "חולון": (32.0158, 34.7874),
-    "פתח תקווה": (32.0840, 34.8878),
-    "ראשון לציון": (31.9710, 34.7894),
-    "רחובות": (31.8948, 34.8113),
-    "נתניה": (32.3215, 34.8532),
-    "הרצליה": (32.1663, 34.8439),
-    "מודיעין": (31.8980, 35.0104),
-    "אשדוד": (31.8014, 34.6436),
-    "באר שבע": (31.2520, 34.7915),
-    "עכו": (32.9234, 35.0827),
-    "נהריה": (33.0058, 35.0940),
-    "כרמיאל": (32.9171, 35.3050),
-    "צפת": (32.9646, 35.4960),
-    "נוף הגליל": (32.7019, 35.3033),
-    "טבריה": (32.7922, 35.5312),
-    "גוליס": (33.0330, 35.3160),  # יישוב קטן לדוגמה
-}
+@st.cache_data(show_spinner=False, max_entries=8)
+def resolve_students_cached(fingerprint: str, _df: pd.DataFrame) -> pd.DataFrame:
+    return resolve_students(_df)
 
-# ===== פונקציות מרחק בין ערים =====
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0  # ק"מ
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
-
-def city_distance_km(city1: str, city2: str) -> Optional[float]:
-    city1 = (city1 or "").strip()
-    city2 = (city2 or "").strip()
-    if not city1 or not city2:
-        return None
-    if city1 == city2:
-        return 0.0
-    if city1 not in cities_coords or city2 not in cities_coords:
-        return None
-    lat1, lon1 = cities_coords[city1]
-    lat2, lon2 = cities_coords[city2]
-    return haversine(lat1, lon1, lat2, lon2)
-
-# ====== חישוב ציון מדויק לפי המשקולות ======
-def compute_score(stu: pd.Series, site: pd.Series, W: Weights) -> float:
-    stu_pref = str(stu.get("stu_pref", "")).strip()
-    site_field = str(site.get("site_field", "")).strip()
-    stu_req  = str(stu.get("stu_req", "")).strip()
-    site_special = str(site.get("site_special", "")).strip()
-    stu_city = str(stu.get("stu_city", "")).strip()
-    site_city = str(site.get("site_city", "")).strip()
-
-    # 1) תחום – 50 נק'
-    field_score = 50 if (stu_pref and site_field and (stu_pref in site_field)) else 0
-
-    # 2) בקשה מיוחדת – 45 נק'
-    special_score = 0
-    if stu_req:
-        near_words = ["קרוב", "קרבה", "סמוך", "בסביבה", "ליד"]
-        if any(w in stu_req for w in near_words):
-            # אם הבקשה היא קרבה – נבדוק מרחק
-            dist = city_distance_km(stu_city, site_city)
-            if dist is not None and dist <= 20:
-                special_score = 45
-        else:
-            # אם הבקשה היא אחרת – נבדוק התאמת טקסט למוסד
-            haystack = " ".join([site_special, site_field, site_city]).strip()
-            if haystack and stu_req in haystack:
-                special_score = 45
-
-    # 3) עיר – עד 5 נק' בלבד
-    city_score = 0
-    dist = city_distance_km(stu_city, site_city)
-    if dist is not None:
-        if dist <= 5:
-            city_score = 5
-        elif dist <= 20:
-            city_score = 3
-        elif dist <= 50:
-            city_score = 1
-
-    total = field_score + special_score + city_score
-
-    # ציון מינימלי 20
-    return max(total, 20)
-
-# ====== שיבוץ ======
-def greedy_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights) -> pd.DataFrame:
-    results = []
-    supervisor_count = {}
-
-    for _, s in students_df.iterrows():
-        cand = sites_df[sites_df["capacity_left"] > 0].copy()
-        if cand.empty:
-            results.append({
-                "ת\"ז הסטודנט": s["stu_id"],
-                "שם פרטי": s["stu_first"],
-                "שם משפחה": s["stu_last"],
-                "שם מקום ההתמחות": "לא שובץ",
-                "עיר המוסד": "",
-                "תחום ההתמחות במוסד": "",
-                "שם המדריך": "",
-                "אחוז התאמה": MIN_SCORE  # גם כשאין, נשמור מינימום
-            })
-            continue
-
-        # מחשב לכל אתר ציון התאמה לפי הנוסחה
-        cand["score"] = cand.apply(lambda r: compute_score(s, r, W), axis=1)
-
-        # מגבלה: עד 2 סטודנטים לכל מדריך
-        cand = cand[cand.apply(lambda r: supervisor_count.get(r.get("שם המדריך",""),0) < 2, axis=1)]
-
-        if cand.empty:
-            results.append({
-                "ת\"ז הסטודנט": s["stu_id"],
-                "שם פרטי": s["stu_first"],
-                "שם משפחה": s["stu_last"],
-                "שם מקום ההתמחות": "לא שובץ",
-                "עיר המוסד": "",
-                "תחום ההתמחות במוסד": "",
-                "שם המדריך": "",
-                "אחוז התאמה": MIN_SCORE
-            })
-            continue
-
-        chosen = cand.sort_values("score", ascending=False).iloc[0]
-        idx = chosen.name
-        sites_df.at[idx, "capacity_left"] -= 1
-
-        sup_name = chosen.get("שם המדריך", "")
-        supervisor_count[sup_name] = supervisor_count.get(sup_name, 0) + 1
-
-        results.append({
-            "ת\"ז הסטודנט": s["stu_id"],
-            "שם פרטי": s["stu_first"],
-            "שם משפחה": s["stu_last"],
-            "שם מקום ההתמחות": chosen["site_name"],
-            "עיר המוסד": chosen.get("site_city", ""),
-            "תחום ההתמחות במוסד": chosen["site_field"],
-            "שם המדריך": sup_name,
-            "אחוז התאמה": round(float(chosen["score"]), 1)
-        })
-
-    return pd.DataFrame(results)
+@st.cache_data(show_spinner=False, max_entries=8)
+def resolve_sites_cached(fingerprint: str, _df: pd.DataFrame) -> pd.DataFrame:
+    return resolve_sites(_df)
 
 # =========================
 # 1) הוראות שימוש
@@ -408,7 +171,8 @@ with colA:
     students_file = st.file_uploader("קובץ סטודנטים", type=["csv","xlsx","xls"], key="students_file")
     if students_file is not None:
         try:
-            st.session_state["df_students_raw"] = read_any(students_file)
+            with page_metrics.activate(), stage("upload_students"):
+                st.session_state["students_fp"], st.session_state["df_students_raw"] = load_upload(students_file)
             st.dataframe(st.session_state["df_students_raw"].head(5), use_container_width=True)
         except Exception as e:
             st.error(f"לא ניתן לקרוא את קובץ הסטודנטים: {e}")
@@ -417,34 +181,43 @@ with colB:
     sites_file = st.file_uploader("קובץ אתרי התמחות/מדריכים", type=["csv","xlsx","xls"], key="sites_file")
     if sites_file is not None:
         try:
-            st.session_state["df_sites_raw"] = read_any(sites_file)
+            with page_metrics.activate(), stage("upload_sites"):
+                st.session_state["sites_fp"], st.session_state["df_sites_raw"] = load_upload(sites_file)
             st.dataframe(st.session_state["df_sites_raw"].head(5), use_container_width=True)
         except Exception as e:
             st.error(f"לא ניתן לקרוא את קובץ האתרים/מדריכים: {e}")
 
-for k in ["df_students_raw","df_sites_raw","result_df"]:
+for k in ["df_students_raw","df_sites_raw","students_fp","sites_fp","result_df","result_hash"]:
     st.session_state.setdefault(k, None)
 
-# ---- יצירת XLSX ----
-def df_to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "שיבוץ") -> bytes:
-    xlsx_io = BytesIO()
-    import xlsxwriter
-    with pd.ExcelWriter(xlsx_io, engine="xlsxwriter") as writer:
-        cols = list(df.columns)
-        has_match_col = "אחוז התאמה" in cols
-        if has_match_col:
-            cols = [c for c in cols if c != "אחוז התאמה"] + ["אחוז התאמה"]
-
-        df[cols].to_excel(writer, index=False, sheet_name=sheet_name)
-
-        if has_match_col:
-            workbook  = writer.book
-            worksheet = writer.sheets[sheet_name]
-            red_fmt = workbook.add_format({"font_color": "red"})
-            col_idx = len(cols) - 1
-            worksheet.set_column(col_idx, col_idx, 12, red_fmt)
-    xlsx_io.seek(0)
-    return xlsx_io.getvalue()
+# ---- ייצוא לפי דרישה ----
+# הקובץ נוצר רק אחרי לחיצה על "הכנת קובץ", ונשמר ב-cache לפי טביעת האצבע של הטבלה,
+# כך שריצות חוזרות של העמוד לא בונות XLSX מחדש.
+@st.cache_data(show_spinner=False, max_entries=8)
+def export_cached(result_hash: str, fmt: str, sheet_name: str, _df: pd.DataFrame) -> bytes:
+    return export_bytes(_df, fmt, sheet_name)
+
+def export_widget(kind: str, df: pd.DataFrame, fmt: str, stem: str, sheet_name: str, label: str) -> None:
+    result_hash = frame_fingerprint(df)
+    ready_key = f"export_ready_{kind}"
+    if st.session_state.get(ready_key) != (result_hash, fmt):
+        if not st.button(f"📦 הכנת קובץ {fmt.upper()} – {label}", key=f"prepare_{kind}", use_container_width=True):
+            return
+        st.session_state[ready_key] = (result_hash, fmt)
+    with page_metrics.activate(), stage(f"export_{kind}"):
+        data = export_cached(result_hash, fmt, sheet_name, df)
+    st.download_button(f"⬇️ הורדת {fmt.upper()} – {label}", data=data,
+        file_name=f"{stem}.{fmt}", mime=EXPORT_MIME[fmt], key=f"download_{kind}")
+
+# טבלת הסיכום נבנית פעם אחת לכל תוצאת שיבוץ (לפי טביעת האצבע שחושבה בסוף העבודה)
+@st.cache_data(show_spinner=False, max_entries=8)
+def summary_cached(result_hash: str, _result_df: pd.DataFrame, _sites) -> pd.DataFrame:
+    return build_summary(_result_df, _sites)
+
+# חלופות לסטודנט נשמרות לפי מזהה ריצת השיבוץ, כך שמעבר בין סטודנטים ודפדוף בטבלה לא מחשבים שוב
+@st.cache_data(show_spinner=False, max_entries=512)
+def alternatives_cached(run_id: str, i: int, k: int, _state) -> pd.DataFrame:
+    return site_alternatives(_state, i, k)
 
 # =========================
 # שיבוץ והצגת תוצאות
@@ -452,66 +225,367 @@ def df_to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "שיבוץ") -> bytes:
 if "result_df" not in st.session_state:
     st.session_state["result_df"] = None
 
+st.session_state.setdefault("engine_stats", None)
+st.session_state.setdefault("run_metrics", None)
+# מצב השיבוץ האחרון (ציונים + שיבוץ) לשיבוץ מצטבר אחרי עדכון קבצים
+st.session_state.setdefault("match_state", None)
+st.session_state.setdefault("rematch_stats", None)
+# עבודת השיבוץ שרצה ברקע (רק המזהה נשמר; העבודה עצמה בתור המשותף של השרת)
+st.session_state.setdefault("job_id", None)
+# השוואת תצורות משקלים – עבודת רקע נפרדת וטבלת התוצאה האחרונה
+st.session_state.setdefault("sweep_job_id", None)
+st.session_state.setdefault("sweep_df", None)
+
+# השלבים ומשקלם בפס ההתקדמות
+JOB_PHASES = {"score": 3, "greedy": 1, "optimal": 4}
+REMATCH_PHASES = {"rematch": 1}
+WARM_PHASES = {"score": 3, "warm": 1}
+HISTORY_PHASES = {"history": 0.3}
+PHASE_LABELS = {"score": "חישוב ציונים", "greedy": "שיבוץ חמדני", "optimal": "שיבוץ אופטימלי",
+                "rematch": "עדכון מצטבר", "warm": "התחלה חמה", "history": "שמירה בהיסטוריה"}
+
+def run_match_job(students, sites, engine, prev, run_metrics, W, warm_run=None, save=None):
+    # רץ ב-thread של עבודת הרקע – בלי קריאות st.*
+    # warm_run – מזהה ריצה מההיסטוריה להתחלה חמה; save – פרטי השמירה בהיסטוריה (או None)
+    history_error = None
+    with run_metrics.activate():
+        if prev is not None:
+            with job_step("rematch"):
+                state, result, rematch_stats = rematch(prev, students, sites, W)
+            engine_stats = {engine: assignment_stats(result)}
+        elif warm_run is not None:
+            with job_step("score"):
+                scores = parallel_score_matrix(students, sites, W)
+            with job_step("warm"):
+                prior = history.prior_placements(warm_run)
+                state, result, rematch_stats = warm_match(students, sites, W, prior, engine, scores=scores)
+            rematch_stats.update(rescored_students=len(students), rescored_sites=len(sites), warm_run=warm_run)
+            engine_stats = {engine: assignment_stats(result)}
+        else:
+            with job_step("score"):
+                scores = parallel_score_matrix(students, sites, W)
+            with job_step(engine):
+                state, result = full_match(students, sites, W, engine, scores=scores)
+            rematch_stats = None
+            # המנוע השני רץ רק לצורך השוואה (על עותק של האתרים)
+            other = "optimal" if engine == "greedy" else "greedy"
+            with job_step(other):
+                other_result = (optimal_match if other == "optimal" else greedy_match)(
+                    students, sites.copy(), W, scores=scores)
+            results = {engine: result, other: other_result}
+            engine_stats = {k: assignment_stats(results[k]) for k in ("greedy", "optimal")}
+        if save is not None:
+            with job_step("history"):
+                try:
+                    history.save_run(result, engine, W, run_id=state.run_id, **save)
+                except (sqlite3.Error, OSError) as e:
+                    history_error = str(e)   # השיבוץ עצמו הצליח – רק מדווחים
+    return {"match_state": state, "result_df": result, "result_hash": frame_fingerprint(result),
+            "engine_stats": engine_stats, "history_error": history_error,
+            "rematch_stats": rematch_stats, "run_metrics": run_metrics}
+
+job = get_job(st.session_state["job_id"])
+if st.session_state["job_id"] and job is None:
+    st.session_state["job_id"] = None   # השרת הופעל מחדש – העבודה אבדה
+
 st.markdown("## ⚙️ ביצוע השיבוץ")
-if st.button("🚀 בצע שיבוץ", use_container_width=True):
+with st.expander("⚖️ משקולות הציון"):
+    st.caption("חלק כל רכיב מתוך 100 נקודות. ברירת המחדל: תחום 50%, בקשה מיוחדת 45%, עיר 5%.")
+    colWF, colWS, colWC, colWM = st.columns(4)
+    with colWF:
+        w_field = st.number_input("תחום", min_value=0.0, max_value=1.0, value=0.50, step=0.05, key="w_field")
+    with colWS:
+        w_special = st.number_input("בקשה מיוחדת", min_value=0.0, max_value=1.0, value=0.45, step=0.05, key="w_special")
+    with colWC:
+        w_city = st.number_input("עיר", min_value=0.0, max_value=1.0, value=0.05, step=0.05, key="w_city")
+    with colWM:
+        min_score = st.number_input("ציון מינימלי", min_value=0.0, max_value=100.0, value=float(MIN_SCORE),
+                                    step=5.0, key="w_min")
+W = Weights(w_field=w_field, w_city=w_city, w_special=w_special, min_score=min_score)
+
+@st.cache_data(show_spinner=False, ttl=5)
+def history_runs() -> pd.DataFrame:
+    try:
+        return history.list_runs()
+    except (sqlite3.Error, OSError):
+        return pd.DataFrame(columns=["run_id", "year", "engine", "created", "total", "unassigned", "n_students"])
+
+def run_label(runs: pd.DataFrame, run_id: str) -> str:
+    r = runs.set_index("run_id").loc[run_id]
+    return f"{r['year']} · {time.strftime('%d/%m/%Y %H:%M', time.localtime(r['created']))} · {r['engine']} · {run_id}"
+
+runs = history_runs()
+with st.expander("📚 היסטוריה והתחלה חמה"):
+    colHY, colHS, colHW = st.columns([1, 1, 2])
+    with colHY:
+        match_year = st.number_input("שנת הכשרה", min_value=2000, max_value=2100,
+                                     value=time.localtime().tm_year, step=1, key="match_year")
+    with colHS:
+        save_history = st.toggle("שמירת הריצה בהיסטוריה", value=True, key="save_history")
+    with colHW:
+        warm_run = st.selectbox("התחלה חמה משיבוץ קודם", [None] + runs["run_id"].tolist(),
+                                format_func=lambda r: "ללא" if r is None else run_label(runs, r), key="warm_run",
+                                help="סטודנטים (לפי ת\"ז) מתחילים במקום שבו שובצו בריצה שנבחרה, אם הוא קיים "
+                                     "גם עכשיו ויש בו מקום; השאר משובצים כרגיל")
+
+    if len(runs):
+        st.dataframe(runs[["year", "created", "engine", "n_students", "total", "unassigned", "run_id"]]
+                     .assign(created=pd.to_datetime(runs["created"], unit="s").dt.strftime("%d/%m/%Y %H:%M"))
+                     .rename(columns={"year": "שנה", "created": "נשמר", "engine": "מנוע", "n_students": "סטודנטים",
+                                      "total": "סך הציונים", "unassigned": "לא שובצו"}),
+                     use_container_width=True, hide_index=True)
+        colQY, colQK, colQV = st.columns([1, 1, 2])
+        with colQY:
+            query_year = st.number_input("שנה לשאילתה", min_value=2000, max_value=2100,
+                                         value=time.localtime().tm_year - 1, step=1, key="query_year")
+        with colQK:
+            query_kind = st.selectbox("חיפוש לפי", ["מדריכים עם סטודנטים בשנה", "ת\"ז סטודנט", "מקום הכשרה", "מדריך"],
+                                      key="query_kind")
+        with colQV:
+            query_value = st.text_input("ערך לחיפוש", key="query_value",
+                                        disabled=query_kind == "מדריכים עם סטודנטים בשנה")
+        with page_metrics.activate(), stage("history_query"):
+            if query_kind == "מדריכים עם סטודנטים בשנה":
+                found = history.supervisors_with_students(int(query_year))
+            elif query_value.strip():
+                lookup = {"ת\"ז סטודנט": history.student_history, "מקום הכשרה": history.site_history,
+                          "מדריך": history.supervisor_history}[query_kind]
+                found = lookup(query_value.strip())
+            else:
+                found = None
+        if found is not None:
+            st.dataframe(found, use_container_width=True, hide_index=True)
+
+        colLR, colLB = st.columns([3, 1])
+        with colLR:
+            load_id = st.selectbox("הצגת שיבוץ שמור", runs["run_id"].tolist(),
+                                   format_func=lambda r: run_label(runs, r), key="load_run")
+        with colLB:
+            if st.button("טעינה", use_container_width=True, key="load_run_btn"):
+                loaded = history.load_run(load_id)
+                st.session_state.update(result_df=loaded, result_hash=frame_fingerprint(loaded),
+                                        match_state=None, engine_stats=None, rematch_stats=None)
+
+colRun, colEngine = st.columns([3, 1], gap="large")
+with colEngine:
+    use_optimal = st.toggle("שיבוץ אופטימלי (גלובלי)", value=False,
+                            help="קודם משבץ כמה שיותר סטודנטים, ומבין השיבוצים האלה בוחר את סכום הציונים "
+                                 "הגבוה ביותר – לכל הסטודנטים יחד, במקום שיבוץ לפי סדר הקובץ")
+    incremental = st.toggle("עדכון מצטבר", value=True,
+                            help="אחרי העלאת קבצים מעודכנים: סטודנטים שלא השתנו נשארים במקומם, "
+                                 "ורק השורות שהשתנו מחושבות ומשובצות מחדש")
+with colRun:
+    run_clicked = st.button("🚀 בצע שיבוץ", use_container_width=True,
+                            disabled=job is not None and not job.done)
+if run_clicked:
     try:
-        students = resolve_students(st.session_state["df_students_raw"])
-        sites    = resolve_sites(st.session_state["df_sites_raw"])
-        result_df = greedy_match(students, sites, Weights())
-        st.session_state["result_df"] = result_df
-        st.success("השיבוץ הושלם ✓")
+        with page_metrics.activate(), stage("resolve"):
+            students = resolve_students_cached(st.session_state["students_fp"], st.session_state["df_students_raw"])
+            sites    = resolve_sites_cached(st.session_state["sites_fp"], st.session_state["df_sites_raw"])
+        engine = "optimal" if use_optimal else "greedy"
+        prev = st.session_state["match_state"]
+        prev = prev if incremental and prev is not None and prev.engine == engine else None
+        warm = warm_run if prev is None else None
+        save = ({"year": int(match_year), "students_fp": st.session_state["students_fp"],
+                 "sites_fp": st.session_state["sites_fp"]} if save_history else None)
+        run_metrics = Metrics(label="match",
+                              profile=st.session_state.get("perf_profile", False),
+                              trace_memory=st.session_state.get("perf_memory", False))
+        phases = REMATCH_PHASES if prev is not None else WARM_PHASES if warm is not None else JOB_PHASES
+        job = submit_job(run_match_job, students, sites, engine, prev, run_metrics, W, warm, save,
+                         label="match", phases={**phases, **(HISTORY_PHASES if save else {})})
+        st.session_state["job_id"] = job.job_id
     except Exception as e:
         st.exception(e)
 
+def queued_text(job) -> str:
+    # כל העבודות בשרת חולקות תור אחד ומספר קטן של עבודות שרצות יחד (MATCH_JOB_WORKERS)
+    ahead = queue_position(job)
+    return "ממתין בתור" + (f" ({ahead} עבודות לפנייך)" if ahead else "")
+
+def job_panel():
+    job = get_job(st.session_state["job_id"])
+    if job is None:
+        return
+    if not job.done:
+        phase = PHASE_LABELS.get(job.phase) or queued_text(job)
+        eta = job.eta_seconds()
+        text = f"{phase} · {job.progress:.0%}" + (f" · עוד כ-{eta:.0f} שניות" if eta is not None else "")
+        st.progress(job.progress, text=text)
+        if st.button("⏹️ ביטול", key=f"cancel_{job.job_id}"):
+            job.cancel()
+        return
+    # העבודה הסתיימה – איסוף התוצאה לתוך ה-session
+    st.session_state["job_id"] = None
+    forget_job(job.job_id)
+    if job.status == "done":
+        st.session_state.update(job.result)
+        st.session_state["job_message"] = ("success", f"השיבוץ הושלם ✓ ({job.elapsed():.1f} שניות)")
+        if job.result["history_error"]:
+            st.session_state["job_message"] = ("warning", "השיבוץ הושלם, אבל השמירה בהיסטוריה נכשלה: "
+                                                          + job.result["history_error"])
+        history_runs.clear()
+        if METRICS_LOG:
+            job.result["run_metrics"].emit_jsonl(METRICS_LOG)
+    elif job.status == "cancelled":
+        st.session_state["job_message"] = ("warning", "השיבוץ בוטל")
+    else:
+        st.session_state["job_message"] = ("error", f"השיבוץ נכשל: {job.error}")
+    st.rerun()
+
+# פס ההתקדמות מתעדכן כל שנייה בלי להריץ את כל העמוד (st.fragment); בגרסאות ישנות – rerun מלא
+fragment = getattr(st, "fragment", None)
+job = get_job(st.session_state["job_id"])
+if job is not None:
+    if fragment is not None:
+        fragment(run_every=1.0)(job_panel)()
+    else:
+        job_panel()
+
+message = st.session_state.pop("job_message", None)
+if message:
+    getattr(st, message[0])(message[1])
+
+if st.session_state["rematch_stats"]:
+    rs = st.session_state["rematch_stats"]
+    source = f"התחלה חמה מריצה {rs['warm_run']}" if rs.get("warm_run") else "עדכון מצטבר"
+    st.info(f"{source}: {rs['kept']} נשארו במקומם, {rs['released']} שוחררו, {rs['placed']} שובצו מחדש "
+            f"(חושבו מחדש {rs['rescored_students']} סטודנטים ו-{rs['rescored_sites']} מקומות)")
+
+if st.session_state["engine_stats"]:
+    engine_labels = {"greedy": "חמדני (לפי סדר)", "optimal": "אופטימלי (גלובלי)"}
+    for col, (engine, stats) in zip(st.columns(2, gap="large"), st.session_state["engine_stats"].items()):
+        with col:
+            st.write(f"**{engine_labels[engine]}**")
+            st.metric("סך הציונים", f"{stats['total']:,.0f}")
+            st.metric("ציון ממוצע", f"{stats['mean']:.1f}")
+            st.caption(f"לא שובצו: {stats['unassigned']}")
+
+# --- השוואת תצורות משקלים (רכיבי הציון מחושבים פעם אחת; כל תצורה משובצת בתהליך נפרד) ---
+def parse_weights(text: str):
+    return [float(x) for x in text.replace(" ", "").split(",") if x]
+
+def run_sweep_job(students, sites, weights, engine):
+    with job_step("sweep"):
+        return sweep(students, sites, weights, engine=engine)
+
+def sweep_panel():
+    sweep_job = get_job(st.session_state["sweep_job_id"])
+    if sweep_job is None:
+        return
+    if not sweep_job.done:
+        text = queued_text(sweep_job) if sweep_job.status == "queued" else "משבץ תצורות"
+        st.progress(sweep_job.progress, text=f"{text} · {sweep_job.progress:.0%}")
+        if st.button("⏹️ ביטול", key=f"cancel_{sweep_job.job_id}"):
+            sweep_job.cancel()
+        return
+    st.session_state["sweep_job_id"] = None
+    forget_job(sweep_job.job_id)
+    if sweep_job.status == "done":
+        st.session_state["sweep_df"] = sweep_job.result
+    elif sweep_job.status == "failed":
+        st.session_state["job_message"] = ("error", f"ההשוואה נכשלה: {sweep_job.error}")
+    st.rerun()
+
+with st.expander("🧮 השוואת משקולות"):
+    st.caption("כל צירוף של הערכים (מופרדים בפסיק) הוא תצורה אחת. "
+               "מדדי ההוגנות (עשירון תחתון, ג'יני) מחושבים על המשובצים בלבד; "
+               "מי שלא שובץ מופיע בעמודה נפרדת (\"לא שובצו\").")
+    colSF, colSS, colSC = st.columns(3)
+    with colSF:
+        sweep_fields = st.text_input("תחום", "0.5, 0.4", key="sweep_fields")
+    with colSS:
+        sweep_specials = st.text_input("בקשה מיוחדת", "0.45, 0.55", key="sweep_specials")
+    with colSC:
+        sweep_cities = st.text_input("עיר", "0.05, 0.1", key="sweep_cities")
+    sweep_job = get_job(st.session_state["sweep_job_id"])
+    if st.button("הרצת השוואה", disabled=st.session_state["df_students_raw"] is None
+                 or st.session_state["df_sites_raw"] is None or (sweep_job is not None and not sweep_job.done)):
+        try:
+            grid = weight_grid(parse_weights(sweep_fields), parse_weights(sweep_specials),
+                               parse_weights(sweep_cities), min_score=min_score)
+            students = resolve_students_cached(st.session_state["students_fp"], st.session_state["df_students_raw"])
+            sites    = resolve_sites_cached(st.session_state["sites_fp"], st.session_state["df_sites_raw"])
+            sweep_job = submit_job(run_sweep_job, students, sites, grid, "optimal" if use_optimal else "greedy",
+                                   label="sweep", phases={"sweep": 1})
+            st.session_state["sweep_job_id"] = sweep_job.job_id
+        except ValueError:
+            st.error("ערכי המשקולות צריכים להיות מספרים מופרדים בפסיק")
+    if st.session_state["sweep_job_id"]:
+        if fragment is not None:
+            fragment(run_every=1.0)(sweep_panel)()
+        else:
+            sweep_panel()
+    if st.session_state["sweep_df"] is not None:
+        st.dataframe(st.session_state["sweep_df"], use_container_width=True, hide_index=True)
+
 if isinstance(st.session_state["result_df"], pd.DataFrame) and not st.session_state["result_df"].empty:
     st.markdown("## 📊 תוצאות השיבוץ")
 
-    df_show = st.session_state["result_df"].copy()
-
-    # העברת תחום ההתמחות אחרי שם מקום ההתמחות
-    cols = list(df_show.columns)
-    if "תחום ההתמחות במוסד" in cols and "שם מקום ההתמחות" in cols:
-        cols.insert(cols.index("שם מקום ההתמחות")+1, cols.pop(cols.index("תחום ההתמחות במוסד")))
-        df_show = df_show[cols]
+    with page_metrics.activate():
+        df_show = order_result_columns(st.session_state["result_df"])
 
     st.dataframe(df_show, use_container_width=True)
 
     # הורדת קובץ תוצאות
-    xlsx_results = df_to_xlsx_bytes(df_show, sheet_name="תוצאות")
-    st.download_button("⬇️ הורדת XLSX – תוצאות השיבוץ", data=xlsx_results,
-        file_name="student_site_matching.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    export_fmt = st.selectbox("פורמט הורדה", list(EXPORT_MIME), format_func=str.upper,
+                              help="לטבלאות גדולות מאוד CSV או Parquet מהירים בהרבה מ-XLSX")
+    export_widget("results", df_show, export_fmt, "student_site_matching", "תוצאות", "תוצאות השיבוץ")
+
+    # --- חלופות לסטודנט (מחושבות רק לסטודנטים שנבחרו) ---
+    state = st.session_state["match_state"]
+    if state is not None and len(state.students) == len(df_show):
+        st.markdown("### 🔎 חלופות לסטודנט")
+        colPick, colK = st.columns([4, 1])
+        with colK:
+            top_k = st.number_input("כמה חלופות", min_value=1, max_value=20, value=5)
+        with colPick:
+            labels = (df_show["ת\"ז הסטודנט"].astype(str) + " – " + df_show["שם פרטי"].astype(str)
+                      + " " + df_show["שם משפחה"].astype(str)).tolist()
+            picked = st.multiselect("בחרו סטודנטים כדי לראות את האתרים הבאים בתור", range(len(labels)),
+                                    format_func=labels.__getitem__, max_selections=10)
+        for i in picked:
+            with st.expander(labels[i], expanded=True):
+                st.dataframe(alternatives_cached(state.run_id, i, int(top_k), state),
+                             use_container_width=True, hide_index=True)
 
     # --- טבלת סיכום ---
-    summary_df = (
-        st.session_state["result_df"]
-        .groupby(["שם מקום ההתמחות","תחום ההתמחות במוסד","שם המדריך"])
-        .agg({
-            "ת\"ז הסטודנט":"count",
-            "שם פרטי": list,
-            "שם משפחה": list
-        }).reset_index()
-    )
-    summary_df.rename(columns={"ת\"ז הסטודנט":"כמה סטודנטים"}, inplace=True)
-
-    # המלצת שיבוץ – שם מלא
-    summary_df["המלצת שיבוץ"] = summary_df.apply(
-        lambda row: " + ".join([f"{f} {l}" for f, l in zip(row["שם פרטי"], row["שם משפחה"])]),
-        axis=1
-    )
-
-    summary_df = summary_df[[
-        "שם מקום ההתמחות",
-        "תחום ההתמחות במוסד",
-        "שם המדריך",
-        "כמה סטודנטים",
-        "המלצת שיבוץ"
-    ]]
+    with page_metrics.activate():
+        result_hash = st.session_state["result_hash"] or frame_fingerprint(st.session_state["result_df"])
+        summary_df = summary_cached(result_hash, st.session_state["result_df"],
+                                    state.sites if state is not None else None)
 
     st.markdown("### 📝 טבלת סיכום לפי מקום הכשרה")
     st.dataframe(summary_df, use_container_width=True)
 
-    xlsx_summary = df_to_xlsx_bytes(summary_df, sheet_name="סיכום")
-    st.download_button("⬇️ הורדת XLSX – טבלת סיכום", data=xlsx_summary,
-        file_name="student_site_summary.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    export_widget("summary", summary_df, export_fmt, "student_site_summary", "סיכום", "טבלת סיכום")
+
+# =========================
+# ביצועים
+# =========================
+with st.expander("⏱️ ביצועים"):
+    st.caption("זמן, מונים ושיא זיכרון לכל שלב. האפשרויות חלות על הלחיצה הבאה על \"בצע שיבוץ\".")
+    colP, colM = st.columns(2)
+    with colP:
+        st.checkbox("פרופיילינג (cProfile)", key="perf_profile")
+    with colM:
+        st.checkbox("מדידת זיכרון (tracemalloc)", key="perf_memory")
+
+    run_metrics = st.session_state["run_metrics"]
+    if run_metrics is not None:
+        st.write(f"**ריצת השיבוץ האחרונה** – {run_metrics.total_seconds():.3f} שניות")
+        st.dataframe(run_metrics.to_frame(), use_container_width=True, hide_index=True)
+        if run_metrics.profile_stats is not None:
+            st.code(run_metrics.profile_text(), language="text")
+
+    if page_metrics.stages:
+        st.write(f"**הרצת העמוד הנוכחית** (העלאות, סיכום, ייצוא) – {page_metrics.total_seconds():.3f} שניות")
+        st.dataframe(page_metrics.to_frame(), use_container_width=True, hide_index=True)
+    if METRICS_LOG and page_metrics.stages:
+        page_metrics.emit_jsonl(METRICS_LOG)
+
+# בגרסאות בלי st.fragment: ריענון העמוד כל שנייה כל עוד השיבוץ רץ
+sweep_job = get_job(st.session_state["sweep_job_id"])
+if fragment is None and ((job is not None and not job.done) or (sweep_job is not None and not sweep_job.done)):
+    time.sleep(1.0)
+    st.rerun()